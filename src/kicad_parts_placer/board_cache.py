@@ -0,0 +1,269 @@
+"""
+board_cache.py: Sidecar footprint snapshot of a board file
+
+The snapshot is a numpy structured array saved next to the board and keyed
+by the hash of the board file. It lets repeated runs answer reference and
+position questions without reparsing the board with pcbnew.LoadBoard.
+"""
+
+import hashlib
+import logging
+import mmap
+import re
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import pcbnew
+
+from . import coordinates
+from .kicad_parts_placer import SideEnum
+
+_log = logging.getLogger("kicad_parts_placer")
+
+_SNAPSHOT_SUFFIX = ".fpcache.npy"
+
+# KiCad 6+ uses (footprint ...), older boards use (module ...)
+_FOOTPRINT_START = re.compile(rb"\((?:footprint|module)\s")
+_REFERENCE = re.compile(
+    rb'\(property\s+"Reference"\s+"([^"]*)"|\(fp_text\s+reference\s+"?([^\s")]+)'
+)
+_FOOTPRINT_NAME = re.compile(rb'\((?:footprint|module)\s+"?([^\s")]+)')
+_ORIGINS = {
+    "aux": re.compile(rb"\(aux_axis_origin\s+(-?[\d.]+)\s+(-?[\d.]+)\)"),
+    "grid": re.compile(rb"\(grid_origin\s+(-?[\d.]+)\s+(-?[\d.]+)\)"),
+}
+
+
+def board_hash(pcb: str) -> str:
+    """
+    sha256 of the board file contents
+    """
+    digest = hashlib.sha256()
+    with open(pcb, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_snapshot_path(pcb: str, digest: Union[str, None] = None) -> Path:
+    """
+    Sidecar file name for a board, <board>.<hash>.fpcache.npy
+    """
+    if digest is None:
+        digest = board_hash(pcb)
+    path = Path(pcb)
+    return path.with_name(f"{path.name}.{digest[:16]}{_SNAPSHOT_SUFFIX}")
+
+
+def find_footprint_offsets(pcb: str) -> dict[str, int]:
+    """
+    Scan the board file for the byte offset of each footprint block,
+    keyed by reference designator
+    """
+    data = Path(pcb).read_bytes()
+    starts = [match.start() for match in _FOOTPRINT_START.finditer(data)]
+    offsets = {}
+    for start, end in zip(starts, [*starts[1:], len(data)]):
+        match = _REFERENCE.search(data, start, end)
+        if match is None:
+            continue
+        ref_des = (match.group(1) or match.group(2)).decode()
+        offsets.setdefault(ref_des, start)
+    return offsets
+
+
+def read_footprint_names(pcb: str, snapshot: np.ndarray) -> list[str]:
+    """
+    Library footprint name of each snapshot entry, read at its byte offset
+    in the board file so the rest of the file is never parsed
+    """
+    names = []
+    with open(pcb, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset in snapshot["offset"].tolist():
+            match = _FOOTPRINT_NAME.match(data, offset) if offset >= 0 else None
+            names.append(match.group(1).decode() if match is not None else "")
+    return names
+
+
+def has_group(pcb: str, group_name: str) -> bool:
+    """
+    True if the board file has a group named group_name
+    """
+    pattern = rb'\(group\s+"' + re.escape(group_name.encode()) + rb'"'
+    return re.search(pattern, Path(pcb).read_bytes()) is not None
+
+
+def find_origin_nm(pcb: str, origin: str = "absolute") -> tuple[int, int]:
+    """
+    Aux or grid origin in nm read from the board file setup section,
+    the same point coordinates.get_origin_nm returns for a loaded board
+    """
+    if origin == "absolute":
+        return (0, 0)
+    if origin not in _ORIGINS:
+        msg = f"Unknown origin {origin}, expected one of {coordinates.ORIGINS}"
+        raise ValueError(msg)
+    # KiCad leaves the origin out of the file when it is at zero
+    match = _ORIGINS[origin].search(Path(pcb).read_bytes())
+    if match is None:
+        return (0, 0)
+    x, y = coordinates.to_nm([float(match.group(1)), float(match.group(2))]).tolist()
+    return (x, y)
+
+
+def _snapshot_dtype(refdes_length: int) -> np.dtype:
+    return np.dtype(
+        [
+            ("refdes", f"U{max(refdes_length, 1)}"),
+            ("x", np.int64),
+            ("y", np.int64),
+            ("orientation", np.float64),
+            ("layer", np.int32),
+            ("locked", np.bool_),
+            ("offset", np.int64),
+        ]
+    )
+
+
+def build_snapshot(board: pcbnew.BOARD, pcb: str) -> np.ndarray:
+    """
+    Record the footprints of a loaded board. pcb is the file the board was
+    loaded from or saved to, used for the byte offsets.
+    """
+    offsets = find_footprint_offsets(pcb)
+    footprints = list(board.GetFootprints())
+    refs = [fp.GetReference() for fp in footprints]
+    snapshot = np.zeros(
+        len(footprints), dtype=_snapshot_dtype(max((len(pt) for pt in refs), default=1))
+    )
+    for i, (ref_des, fp) in enumerate(zip(refs, footprints)):
+        position = fp.GetPosition()
+        snapshot[i] = (
+            ref_des,
+            position.x,
+            position.y,
+            fp.GetOrientationDegrees(),
+            fp.GetLayer(),
+            fp.IsLocked(),
+            offsets.get(ref_des, -1),
+        )
+    return snapshot
+
+
+def save_snapshot(snapshot: np.ndarray, pcb: str) -> Path:
+    """
+    Write the snapshot sidecar for the current contents of pcb,
+    removing any stale snapshots of the same board
+    """
+    path = get_snapshot_path(pcb)
+    for stale in path.parent.glob(f"{Path(pcb).name}.*{_SNAPSHOT_SUFFIX}"):
+        if stale != path:
+            stale.unlink()
+    np.save(path, snapshot, allow_pickle=False)
+    _log.debug("Snapshot saved %s", path)
+    return path
+
+
+def load_snapshot(pcb: str) -> Union[np.ndarray, None]:
+    """
+    Load the snapshot for pcb, returns None if there is no
+    snapshot matching the current board contents.
+    The snapshot is read into memory rather than mapped so save_snapshot
+    can replace the file while the array is still in use.
+    """
+    path = get_snapshot_path(pcb)
+    if not path.exists():
+        return None
+    _log.debug("Snapshot loaded %s", path)
+    return np.array(np.load(path, allow_pickle=False))
+
+
+def get_snapshot(pcb: str, board: Union[pcbnew.BOARD, None] = None) -> np.ndarray:
+    """
+    Load the snapshot for pcb, building and saving it if it is missing or stale.
+    The board is only loaded if a snapshot has to be built and none is passed in.
+    """
+    snapshot = load_snapshot(pcb)
+    if snapshot is not None:
+        return snapshot
+    if board is None:
+        board = pcbnew.LoadBoard(pcb)
+    snapshot = build_snapshot(board, pcb)
+    save_snapshot(snapshot, pcb)
+    return snapshot
+
+
+def get_missing_references(snapshot: np.ndarray, components_df) -> list[str]:
+    """
+    return a list of references in the dataframe missing from the snapshot
+    """
+    refs = np.asarray(components_df["refdes"], dtype=str)
+    return list(refs[~np.isin(refs, snapshot["refdes"])])
+
+
+def snapshot_to_df(
+    snapshot: np.ndarray,
+    pcb: Union[str, None] = None,
+    origin_nm: tuple[int, int] = (0, 0),
+) -> pd.DataFrame:
+    """
+    Export the snapshot in the same form as a placement config.
+    Positions are in mm, cartesian, relative to origin_nm.
+    If the board file is given the footprint names are added from the recorded offsets.
+    """
+    components_df = pd.DataFrame(
+        {
+            "refdes": snapshot["refdes"],
+            "x": coordinates.from_nm(snapshot["x"] - origin_nm[0]),
+            "y": -coordinates.from_nm(snapshot["y"] - origin_nm[1]),
+            "rotation": snapshot["orientation"],
+            "side": np.where(snapshot["layer"] == pcbnew.F_Cu, "top", "bottom"),
+            "locked": snapshot["locked"],
+        }
+    )
+    if pcb is not None:
+        components_df["footprint"] = read_footprint_names(pcb, snapshot)
+    return components_df
+
+
+def changed_references(
+    snapshot: np.ndarray,
+    components_df,
+    origin_nm: tuple[int, int] = (0, 0),
+) -> list[str]:
+    """
+    References in a standardized dataframe whose placement differs from the snapshot.
+    Missing references are included so they are reported during placement.
+    :param origin_nm: reference point in nm, see coordinates.get_origin_nm
+    """
+    current = pd.DataFrame(
+        {
+            "x": snapshot["x"],
+            "y": snapshot["y"],
+            "orientation": snapshot["orientation"],
+            "layer": snapshot["layer"],
+        },
+        index=snapshot["refdes"],
+    )
+    current = current[~current.index.duplicated()]
+    refs = components_df["refdes"].astype(str)
+    current = current.reindex(refs)
+
+    x_nm, y_nm = coordinates.to_board_coordinates(
+        components_df["x"], components_df["y"], origin_nm, coordinates.get_units(components_df)
+    )
+    rotation = components_df["rotation"].astype(float).to_numpy()
+    on_top = current["layer"].to_numpy() == pcbnew.F_Cu
+    side = components_df["side"].to_numpy()
+
+    moved = (
+        (current["x"].to_numpy() != x_nm)
+        | (current["y"].to_numpy() != y_nm)
+        | (np.abs((current["orientation"].to_numpy() - rotation + 180) % 360 - 180) > 1e-6)
+        | ((side == SideEnum.top) & ~on_top)
+        | ((side == SideEnum.bottom) & on_top)
+        | current["x"].isna().to_numpy()
+    )
+    return list(refs[moved])
@@ -4,17 +4,49 @@ kicad_parts_placer
 Command line tool which sets the position of components from a spreadsheet
 """
 
+import functools
 import logging
+import shutil
+import sys
 
 import click
 import pcbnew
 
+from . import board_cache
+from . import coordinates
 from . import file_io
-from .kicad_parts_placer import place_parts, mirror_parts, group_parts, setup_dataframe, check_input_valid
+from . import legalize
+from . import watch as watch_mode
+from . import fixture
+from .kicad_parts_placer import place_parts, place_parts_chunked, mirror_components, is_config_column, load_header_pseudonyms, group_parts, setup_dataframe, check_input_valid
 from . import __version__
 
 _log = logging.getLogger("kicad_parts_placer")
 
+
+def _warn_missing(snapshot, components):
+    missing = board_cache.get_missing_references(snapshot, components)
+    if len(missing):
+        _log.warning("Missing references: %s", ", ".join(missing))
+    return missing
+
+
+def _read_components(config, units):
+    """
+    Read and check the config, returns None after logging the errors if it is invalid
+    """
+    components = setup_dataframe(
+        file_io.read_file_to_df(config, usecols=is_config_column), units=units
+    )
+    input_valid, input_errors = check_input_valid(components)
+
+    if not input_valid:
+        msg = "\n".join(input_errors)
+        _log.error(msg)
+        return None
+    return components
+
+
 @click.command(
     help="Takes a PCB & configuration data in mm, sets rotation and location on a new pcb"
 )
@@ -27,6 +59,14 @@ _log = logging.getLogger("kicad_parts_placer")
 )
 @click.option("--inplace", "-i", is_flag=True, help="Edit pcb file in place")
 @click.option("--drill_center", is_flag=True, help="Use drill/file/AUX center as reference point")
+@click.option("--grid_origin", is_flag=True, help="Use the grid origin as reference point")
+@click.option(
+    "--units",
+    type=click.Choice(["mm", "mil", "inch"]),
+    default="mm",
+    show_default=True,
+    help="Units of x and y columns that have no unit in the header",
+)
 # @click.option("--center-on-board", is_flag=True, help="Center group on board bounding box")
 @click.option(
     "--flip",
@@ -36,9 +76,70 @@ _log = logging.getLogger("kicad_parts_placer")
 @click.option(
     "--group", "group_name", type=str, help="name of parts group, defaults to file name"
 )
+@click.option(
+    "--cache",
+    is_flag=True,
+    help="Use and update a footprint snapshot next to the board to skip unchanged parts",
+)
+@click.option(
+    "--legalize_grid",
+    type=float,
+    help="Nudge overlapping parts apart on a grid of this step size in mm",
+)
+@click.option(
+    "--clearance",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Minimum spacing between part pads in mm when legalizing",
+)
+@click.option(
+    "--legalize_report", type=str, help="Spreadsheet to write the moved parts to"
+)
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    help="Stream the config in chunks of this many rows to bound memory use",
+)
+@click.option(
+    "--headers",
+    type=str,
+    help="Spreadsheet of extra header names with field, alias and optional scale columns",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep running and re-apply changed rows each time the config is saved",
+)
+@click.option(
+    "--mirror_pcb",
+    type=str,
+    help="Second board to place the mirrored parts on, such as the probe side of a fixture",
+)
+@click.option("--mirror_out", type=str, help="PCB file to write the mirrored board to")
 @click.option("--debug", is_flag=True, help="")
 @click.version_option(__version__)
-def main(pcb, config, out, inplace, drill_center, flip, group_name, debug):
+def main(
+    pcb,
+    config,
+    out,
+    inplace,
+    drill_center,
+    grid_origin,
+    units,
+    flip,
+    group_name,
+    cache,
+    legalize_grid,
+    clearance,
+    legalize_report,
+    chunksize,
+    headers,
+    watch,
+    mirror_pcb,
+    mirror_out,
+    debug,
+):
     """
     top level cli
     """
@@ -53,28 +154,120 @@ def main(pcb, config, out, inplace, drill_center, flip, group_name, debug):
         msg = "Either the inplace flag needs to be set or the --out option set"
         raise ValueError(msg)
 
-    board = pcbnew.LoadBoard(pcb)
-    # bounding_box = board.GetBoardEdgesBoundingBox() #  FIXME use this to check placement
+    if headers is not None:
+        load_header_pseudonyms(headers)
 
-    origin = (0,0)
+    if drill_center and grid_origin:
+        msg = "--drill_center and --grid_origin cannot be used together"
+        raise click.UsageError(msg)
+    origin = "absolute"
     if drill_center:
-        origin=pcbnew.ToMM(board.GetDesignSettings().GetAuxOrigin())
+        origin = "aux"
+    elif grid_origin:
+        origin = "grid"
 
-    components = setup_dataframe(file_io.read_file_to_df(config))
-    input_valid, input_errors = check_input_valid(components)
+    if group_name is None:
+        group_name = config.split(".")[0]
 
-    if not input_valid:
-        msg = "\n".join(input_errors)
-        _log.error(msg)
+    legalize_components = None
+    if legalize_grid is not None:
+        legalize_components = functools.partial(
+            legalize.legalize_board,
+            grid=legalize_grid,
+            clearance=clearance,
+            report=legalize_report,
+        )
+
+    if mirror_pcb is not None:
+        if mirror_out is None:
+            msg = "--mirror_out is required with --mirror_pcb"
+            raise click.UsageError(msg)
+        if flip or cache or watch or chunksize is not None:
+            msg = "--mirror_pcb cannot be combined with --flip, --cache, --watch or --chunksize"
+            raise click.UsageError(msg)
+
+        components = _read_components(config, units)
+        if components is None:
+            return
+        # legalized in the worker that loads pcb, the board is not parsed here
+        placed, _errors = fixture.place_fixture(
+            pcb=pcb,
+            out=out,
+            mirror_pcb=mirror_pcb,
+            mirror_out=mirror_out,
+            components_df=components,
+            group_name=group_name,
+            origin=origin,
+            prepare=legalize_components,
+        )
+        if not placed:
+            sys.exit(1)
+        return 0
+
+    if chunksize is not None:
+        if legalize_grid is not None or cache or watch:
+            msg = "--chunksize cannot be combined with --legalize_grid, --cache or --watch"
+            raise click.UsageError(msg)
+
+        board = pcbnew.LoadBoard(pcb)
+        input_valid, input_errors = place_parts_chunked(
+            board=board,
+            chunks=file_io.read_file_to_df_chunks(
+                config, chunksize, usecols=is_config_column
+            ),
+            group_name=group_name,
+            mirror=flip,
+            origin_nm=coordinates.get_origin_nm(board, origin),
+            units=units,
+        )
+        if not input_valid:
+            msg = "\n".join(input_errors)
+            _log.error(msg)
+            return
+
+        board.Save(out)
+        _log.info(f"Placement complete. Board saved {out}")
+        return 0
+
+    components = _read_components(config, units)
+    if components is None:
         return
 
-    if group_name is None:
-        group_name = config.split(".")[0]
+    snapshot = board_cache.load_snapshot(pcb) if cache else None
+    if snapshot is not None:
+        _warn_missing(snapshot, components)
+        # Nothing to place, answer from the snapshot without loading the board.
+        # The board is still loaded if the parts group has to be added.
+        if legalize_grid is None and not watch and board_cache.has_group(pcb, group_name):
+            placed = mirror_components(components) if flip else components
+            origin_nm = board_cache.find_origin_nm(pcb, origin)
+            if not board_cache.changed_references(snapshot, placed, origin_nm):
+                if out != pcb:
+                    shutil.copyfile(pcb, out)
+                    board_cache.save_snapshot(snapshot, out)
+                _log.info(f"No parts changed, board not loaded. Board saved {out}")
+                return 0
+
+    board = pcbnew.LoadBoard(pcb)
+    # bounding_box = board.GetBoardEdgesBoundingBox() #  FIXME use this to check placement
+    origin_nm = coordinates.get_origin_nm(board, origin)
+
+    if legalize_components is not None:
+        components = legalize_components(board, components)
+
+    to_place = mirror_components(components) if flip else components
+    if cache:
+        if snapshot is None:
+            snapshot = board_cache.get_snapshot(pcb, board)
+            _warn_missing(snapshot, components)
+        changed = board_cache.changed_references(snapshot, to_place, origin_nm)
+        _log.info("%d of %d parts changed", len(changed), len(components))
+        to_place = to_place[to_place["refdes"].isin(changed)]
 
     board = place_parts(
         board=board,
-        components_df=components,
-        origin=origin
+        components_df=to_place,
+        origin_nm=origin_nm,
     )
 
     board = group_parts(
@@ -82,14 +275,100 @@ def main(pcb, config, out, inplace, drill_center, flip, group_name, debug):
         components_df=components,
         group_name=group_name)
 
-    if flip:
-        board = mirror_parts(
+    board.Save(out)
+    if cache:
+        board_cache.save_snapshot(board_cache.build_snapshot(board, out), out)
+    _log.info(f"Placement complete. Board saved {out}")
+
+    if watch:
+        watch_mode.watch_config(
             board=board,
+            config=config,
+            out=out,
             components_df=components,
-            origin=origin)
+            group_name=group_name,
+            origin_nm=origin_nm,
+            units=units,
+            mirror=flip,
+            prepare=(
+                functools.partial(legalize_components, board)
+                if legalize_components is not None
+                else None
+            ),
+        )
+    return 0
 
-    board.Save(out)
-    _log.info(f"Placement complete. Board saved {out}")
+
+@click.command(
+    help="Check a config against a board and export its parts using the footprint snapshot"
+)
+@click.option("--pcb", type=str, required=True, help="PCB file to check")
+@click.option("--config", type=str, help="Spreadsheet configuration file to check for missing parts")
+@click.option(
+    "--units",
+    type=click.Choice(["mm", "mil", "inch"]),
+    default="mm",
+    show_default=True,
+    help="Units of x and y columns that have no unit in the header",
+)
+@click.option("--export", type=str, help="Spreadsheet to write the board parts to")
+@click.option("--drill_center", is_flag=True, help="Use drill/file/AUX center as reference point")
+@click.option("--grid_origin", is_flag=True, help="Use the grid origin as reference point")
+@click.option(
+    "--flip",
+    is_flag=True,
+    help="Check against the mirrored parts, as placed with --flip",
+)
+@click.option("--headers", type=str, help="Spreadsheet of extra header names")
+@click.option("--debug", is_flag=True, help="")
+@click.version_option(__version__)
+def check(pcb, config, units, export, drill_center, grid_origin, flip, headers, debug):
+    """
+    Answer from the snapshot next to the board, the board is only loaded
+    the first time to build it.
+    Exits with status 1 if config has parts missing from the board or
+    placed differently to the config.
+    """
+    logging.basicConfig()
+    _log.setLevel(logging.INFO)
+    if debug:
+        _log.setLevel(logging.DEBUG)
+
+    if headers is not None:
+        load_header_pseudonyms(headers)
+
+    if drill_center and grid_origin:
+        msg = "--drill_center and --grid_origin cannot be used together"
+        raise click.UsageError(msg)
+    origin = "absolute"
+    if drill_center:
+        origin = "aux"
+    elif grid_origin:
+        origin = "grid"
+
+    snapshot = board_cache.get_snapshot(pcb)
+    origin_nm = board_cache.find_origin_nm(pcb, origin)
+
+    if export is not None:
+        file_io.write(board_cache.snapshot_to_df(snapshot, pcb, origin_nm), export, index=False)
+        _log.info(f"{len(snapshot)} parts exported to {export}")
+
+    if config is not None:
+        components = _read_components(config, units)
+        if components is None:
+            sys.exit(1)
+        missing = _warn_missing(snapshot, components)
+        placed = mirror_components(components) if flip else components
+        changed = [
+            ref_des
+            for ref_des in board_cache.changed_references(snapshot, placed, origin_nm)
+            if ref_des not in missing
+        ]
+        if len(changed):
+            _log.warning("Placement differs from config: %s", ", ".join(changed))
+        if len(missing) or len(changed):
+            sys.exit(1)
+        _log.info("All parts found and placed as in the config")
     return 0
 
 
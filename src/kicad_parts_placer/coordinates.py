@@ -0,0 +1,104 @@
+"""
+coordinates.py: Whole array conversion between user units and KiCad nanometres
+
+KiCad stores positions as integer nanometres and rounds conversions from user
+units half away from zero (KiROUND). Doing the same here with numpy converts a
+whole column at once instead of calling pcbnew.FromMM for every part.
+"""
+
+from typing import Tuple, Union
+
+import numpy as np
+import pcbnew
+
+# Also the unit names accepted in headers such as "x (mil)" or "PosX[in]"
+NM_PER_UNIT = {
+    "nm": 1,
+    "um": 1_000,
+    "mm": 1_000_000,
+    "millimeter": 1_000_000,
+    "millimeters": 1_000_000,
+    "cm": 10_000_000,
+    "mil": 25_400,
+    "mils": 25_400,
+    "thou": 25_400,
+    "inch": 25_400_000,
+    "inches": 25_400_000,
+    "in": 25_400_000,
+}
+
+ORIGINS = ("absolute", "aux", "grid")
+
+
+def kiround(values) -> np.ndarray:
+    """
+    Round half away from zero to int64, matching KiCad's KiROUND
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+
+def to_nm(values, unit: str = "mm") -> np.ndarray:
+    """
+    Convert values in unit to integer nanometres
+    """
+    return kiround(np.asarray(values, dtype=np.float64) * NM_PER_UNIT[unit])
+
+
+def from_nm(values, unit: str = "mm") -> np.ndarray:
+    """
+    Convert integer nanometres to floats in unit
+    """
+    return np.asarray(values, dtype=np.float64) / NM_PER_UNIT[unit]
+
+
+def get_units(components_df) -> str:
+    """
+    Units of the x and y columns of a standardized dataframe, set by
+    setup_dataframe, mm if not recorded
+    """
+    return components_df.attrs.get("units", "mm")
+
+
+def get_origin_nm(board: pcbnew.BOARD, origin: str = "absolute") -> Tuple[int, int]:
+    """
+    Board reference point in nm
+    :param str origin: absolute (page origin), aux (drill/file origin) or grid
+    """
+    if origin == "absolute":
+        return (0, 0)
+    settings = board.GetDesignSettings()
+    if origin == "aux":
+        point = settings.GetAuxOrigin()
+    elif origin == "grid":
+        point = settings.GetGridOrigin()
+    else:
+        msg = f"Unknown origin {origin}, expected one of {ORIGINS}"
+        raise ValueError(msg)
+    return (int(point.x), int(point.y))
+
+
+def to_board_coordinates(
+    x,
+    y,
+    origin_nm: Tuple[int, int] = (0, 0),
+    unit: str = "mm",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert cartesian x, y offsets from an origin to board positions in nm.
+    The board y axis points down so y is negated.
+    """
+    return (
+        origin_nm[0] + to_nm(x, unit),
+        origin_nm[1] - to_nm(y, unit),
+    )
+
+
+def get_origin_from_mm(origin: Union[Tuple[float, float], None]) -> Tuple[int, int]:
+    """
+    Reference point given in mm as integer nm
+    """
+    if origin is None:
+        return (0, 0)
+    x, y = to_nm(origin).tolist()
+    return (x, y)
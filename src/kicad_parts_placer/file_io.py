@@ -3,7 +3,9 @@ file_io.py: All the file read and write functions
 """
 
 import csv
+from collections.abc import Iterator
 from pathlib import Path
+from typing import Union
 
 import numpy as np
 import pandas as pd
@@ -27,12 +29,21 @@ def read_csv_to_df(fname: str, **kwargs) -> pd.DataFrame:
     return pd.read_csv(fname, engine="python", **kwargs)
 
 
+def read_csv_chunks(fname: str, chunksize: int, **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Read a csv in chunks of chunksize rows, same arguments as read_csv_to_df
+    """
+    with read_csv_to_df(fname, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
+
+
 def read_ods_format_to_df(fname: str, **kwargs) -> pd.DataFrame:
     """
     Read ODS format to dataframe
     """
     import pyexcel_ods3
 
+    usecols = kwargs.pop("usecols", None)
     data = pyexcel_ods3.get_data(fname, **kwargs)
     ave_line_length = np.mean([len(line) for line in data])
     data_lines = [
@@ -44,7 +55,90 @@ def read_ods_format_to_df(fname: str, **kwargs) -> pd.DataFrame:
     for line in data_lines:
         for column, pt in zip(df_dict.keys(), line, strict=False):
             df_dict[column].append(pt)
-    return pd.DataFrame(df_dict)
+    df = pd.DataFrame(df_dict)
+    if usecols is not None:
+        df = df[_select_columns(df.columns, usecols)]
+    return df
+
+
+def _select_columns(names, usecols) -> Union[list, None]:
+    """
+    Resolve a usecols argument, either a list of names or a callable
+    taking a column name, against the available column names
+    """
+    if usecols is None:
+        return None
+    if callable(usecols):
+        return [name for name in names if usecols(name)]
+    return list(usecols)
+
+
+def read_parquet_to_df(fname: str, usecols=None, **kwargs) -> pd.DataFrame:
+    """
+    Read a parquet file, only loading the columns selected by usecols
+    """
+    import pyarrow.parquet as pq
+
+    columns = _select_columns(pq.read_schema(fname).names, usecols)
+    table = pq.read_table(fname, columns=columns, memory_map=True, **kwargs)
+    return table.to_pandas()
+
+
+def read_parquet_chunks(
+    fname: str, chunksize: int, usecols=None, **kwargs
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a parquet file in batches of chunksize rows
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(fname, memory_map=True, **kwargs)
+    columns = _select_columns(parquet_file.schema_arrow.names, usecols)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_feather_to_df(fname: str, usecols=None, **kwargs) -> pd.DataFrame:
+    """
+    Read a feather/arrow IPC file. The file is memory mapped, uncompressed
+    files are read without copying the column buffers.
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    with pa.memory_map(fname) as source:
+        names = pa.ipc.open_file(source).schema.names
+    columns = _select_columns(names, usecols)
+    return feather.read_table(fname, columns=columns, memory_map=True, **kwargs).to_pandas()
+
+
+def read_feather_chunks(
+    fname: str, chunksize: int, usecols=None
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a feather/arrow IPC file in chunks of at most chunksize rows
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(fname) as source:
+        reader = pa.ipc.open_file(source)
+        columns = _select_columns(reader.schema.names, usecols)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for start in range(0, batch.num_rows, chunksize):
+                yield batch.slice(start, chunksize).to_pandas()
+
+
+def write_feather(df: pd.DataFrame, fname: str, index: bool = True, **kwargs) -> None:
+    """
+    Write an uncompressed feather file so it can be memory mapped on read.
+    Feather has no index, it is written as a column unless index is False.
+    """
+    kwargs.setdefault("compression", "uncompressed")
+    df = df.reset_index(drop=not index or isinstance(df.index, pd.RangeIndex))
+    df.to_feather(fname, **kwargs)
 
 
 def get_supported_file_types_df():
@@ -67,6 +161,7 @@ def get_supported_file_types_df():
             "extensions": ("csv", "txt"),
             "writedf": pd.DataFrame.to_csv,
             "readf": read_csv_to_df,
+            "readchunksf": read_csv_chunks,
         },
         {
             "title": "excel",
@@ -74,6 +169,7 @@ def get_supported_file_types_df():
             "extensions": ("xls", "xlsx", "xlsm", "xlsb"),
             "writedf": pd.DataFrame.to_excel,
             "readf": pd.read_excel,
+            "readchunksf": None,
         },
         {
             "title": "ods",
@@ -81,6 +177,23 @@ def get_supported_file_types_df():
             "extensions": ("ods", "odt", "odf"),
             "writedf": None,
             "readf": read_ods_format_to_df,
+            "readchunksf": None,
+        },
+        {
+            "title": "parquet",
+            "kwargs": {},
+            "extensions": ("parquet", "pq"),
+            "writedf": pd.DataFrame.to_parquet,
+            "readf": read_parquet_to_df,
+            "readchunksf": read_parquet_chunks,
+        },
+        {
+            "title": "feather",
+            "kwargs": {},
+            "extensions": ("feather", "arrow", "ipc"),
+            "writedf": write_feather,
+            "readf": read_feather_to_df,
+            "readchunksf": read_feather_chunks,
         },
     ]
 
@@ -115,6 +228,31 @@ def read_file_to_df(fname: str, **kwargs) -> pd.DataFrame:
     return pd.DataFrame(df)
 
 
+def read_file_to_df_chunks(
+    fname: str, chunksize: int, **kwargs
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the file as dataframes of at most chunksize rows.
+    Formats without a streaming reader are read whole and then split.
+    """
+    assert chunksize > 0
+    ext = Path(fname).suffix.strip(".").lower()
+    for reader in get_supported_file_types_df():
+        if ext in reader["extensions"]:
+            break
+    else:
+        msg = f"Extension {ext} unsupported"
+        raise UserWarning(msg)
+
+    if reader["readchunksf"] is not None:
+        yield from reader["readchunksf"](fname, chunksize, **kwargs)
+        return
+
+    df = pd.DataFrame(reader["readf"](fname, **kwargs))
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start : start + chunksize].copy()
+
+
 def write(df: pd.DataFrame, fname: str, **kwargs) -> None:
     """
     Search for the correct exporter and write the dataframe
@@ -0,0 +1,164 @@
+"""
+fixture.py: Place one config onto several boards in parallel
+
+A bed of nails fixture has a DUT side board and a mirrored probe side board
+placed from the same config. The config is parsed and checked once, then
+each board is loaded, placed and saved in its own worker process.
+The boards are only saved once every worker has placed its parts, so an
+error on one board leaves all the outputs unwritten.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Tuple, Union
+
+import pcbnew
+
+from . import coordinates
+from .kicad_parts_placer import group_parts, mirror_components, place_parts
+
+_log = logging.getLogger("kicad_parts_placer")
+
+
+def _receive(exchange):
+    components_df = exchange.get()
+    if components_df is None:
+        msg = "No placement received, preparing the first board failed"
+        raise RuntimeError(msg)
+    return components_df
+
+
+def place_board(
+    pcb: str,
+    out: str,
+    components_df,
+    group_name: Union[str, None] = None,
+    origin: str = "absolute",
+    mirror: bool = False,
+    prepare: Union[Callable, None] = None,
+    exchange=None,
+    receivers: int = 0,
+    barrier=None,
+) -> str:
+    """
+    Load a board, place and group the parts of a standardized dataframe and save it
+    :param str origin: reference point, absolute, aux or grid, of this board
+    :param bool mirror: place the parts reflected over the y axis, as mirror_parts
+    :param prepare: optional function (board, components_df) -> components_df
+        run before placing, such as legalize.legalize_board
+    :param exchange: queue the prepared dataframe is put on for each of receivers,
+        read from instead if components_df is None
+    :param barrier: the board is saved once every worker sharing the barrier has placed
+    """
+    sent = 0
+    try:
+        board = pcbnew.LoadBoard(pcb)
+        if components_df is None:
+            components_df = _receive(exchange)
+        elif prepare is not None:
+            components_df = prepare(board, components_df)
+        for _ in range(receivers):
+            exchange.put(components_df)
+            sent += 1
+
+        origin_nm = coordinates.get_origin_nm(board, origin)
+        to_place = mirror_components(components_df) if mirror else components_df
+        place_parts(board=board, components_df=to_place, origin_nm=origin_nm)
+        group_parts(board=board, components_df=to_place, group_name=group_name)
+    except BaseException:
+        # unblock the other workers so they fail instead of waiting
+        for _ in range(receivers - sent):
+            exchange.put(None)
+        if barrier is not None:
+            barrier.abort()
+        raise
+
+    if barrier is not None:
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            msg = "Not saved, placing another board failed"
+            raise RuntimeError(msg) from None
+    board.Save(out)
+    return out
+
+
+def place_boards(
+    jobs: Iterable[Tuple[str, str, bool]],
+    components_df,
+    group_name: Union[str, None] = None,
+    origin: str = "absolute",
+    prepare: Union[Callable, None] = None,
+) -> Tuple[bool, list]:
+    """
+    Run place_board for each (pcb, out, mirror) job in a separate process.
+    pcbnew objects can't be shared so each worker loads its own board.
+    :param prepare: optional picklable function (board, components_df) -> components_df
+        run in the first job, the result is placed on every board
+    :returns: success and the errors of each board that failed
+    """
+    jobs = list(jobs)
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+        max_workers=len(jobs)
+    ) as executor:
+        barrier = manager.Barrier(len(jobs))
+        exchange = manager.Queue() if prepare is not None else None
+        futures = []
+        for i, (pcb, out, mirror) in enumerate(jobs):
+            if prepare is None or i == 0:
+                job_df = components_df
+                receivers = len(jobs) - 1 if prepare is not None else 0
+            else:
+                job_df = None
+                receivers = 0
+            futures.append(
+                executor.submit(
+                    place_board,
+                    pcb,
+                    out,
+                    job_df,
+                    group_name,
+                    origin,
+                    mirror,
+                    prepare if i == 0 else None,
+                    exchange,
+                    receivers,
+                    barrier,
+                )
+            )
+
+        errors = []
+        for (pcb, _out, _mirror), future in zip(jobs, futures):
+            try:
+                out = future.result()
+            except Exception as e:
+                errors.append(f"{pcb}: {e}")
+                _log.error("%s: %s", pcb, e)
+            else:
+                _log.info(f"Placement complete. Board saved {out}")
+    return len(errors) == 0, errors
+
+
+def place_fixture(
+    pcb: str,
+    out: str,
+    mirror_pcb: str,
+    mirror_out: str,
+    components_df,
+    group_name: Union[str, None] = None,
+    origin: str = "absolute",
+    prepare: Union[Callable, None] = None,
+) -> Tuple[bool, list]:
+    """
+    Place the parts on pcb and the mirrored parts on mirror_pcb concurrently
+    :param prepare: optional function run against pcb before placing, see place_boards
+    """
+    return place_boards(
+        [(pcb, out, False), (mirror_pcb, mirror_out, True)],
+        components_df,
+        group_name=group_name,
+        origin=origin,
+        prepare=prepare,
+    )
@@ -3,11 +3,17 @@ kicad_parts_placer: Place parts programatically
 """
 
 import logging
-import copy
-from typing import Union, Tuple
+import functools
+import math
+import re
+from typing import Iterable, Union, Tuple
+import numpy as np
+import pandas as pd
 import pcbnew
 from enum import Enum
 
+from . import coordinates
+
 
 class SideEnum(Enum):
     top = "TOP"
@@ -19,37 +25,178 @@ _log = logging.getLogger("kicad_parts_placer")
 
 _HEADER_PSEUDONYMS = {
     "refdes": ["designator", "referencedesignator", "ref", "refdes"],
-    "x": ["posx", "positionx", "xpos", "xposition", "midx", "xmid", "x"],
-    "y": ["posy", "positiony", "ypos", "yposition", "midy", "ymid", "y"],
+    "x": ["posx", "positionx", "xpos", "xposition", "midx", "xmid", "centerx", "centrex", "cx", "x"],
+    "y": ["posy", "positiony", "ypos", "yposition", "midy", "ymid", "centery", "centrey", "cy", "y"],
     "rotation": ["rot", "angle", "rotate", "rotation"],
     "side": ["layer", "side"],
 }
 
+# Scale from an angle unit given in a header, "rot (rad)", to degrees.
+# Length units are kept as given and converted exactly using coordinates.NM_PER_UNIT
+_ANGLE_SCALES = {
+    "deg": 1.0,
+    "degree": 1.0,
+    "degrees": 1.0,
+    "rad": 180 / math.pi,
+    "radian": 180 / math.pi,
+    "radians": 180 / math.pi,
+}
+
+_LENGTH_FIELDS = ("x", "y")
+_SCALED_FIELDS = ("x", "y", "rotation")
+
+_UNIT_SUFFIX = re.compile(
+    r"^(?P<name>.+?)[\s_\-]*"
+    r"(?:[(\[]\s*(?P<bracketed>[a-z]+)\s*[)\]]|[\s_\-](?P<separated>[a-z]+))$"
+)
 
+# normalized alias -> (field, scale), a scale of None uses the default units
 _PSEUDONYMS_INVERT = {
-    alias: key for key, aliases in _HEADER_PSEUDONYMS.items() for alias in aliases
+    alias: (key, None) for key, aliases in _HEADER_PSEUDONYMS.items() for alias in aliases
 }
 
 _REQUIRED_COLUMNS = {"x", "y", "refdes"}
 
 
+def _normalize_header_name(name: str) -> str:
+    return re.sub(r"[\s_\-]", "", name.lower())
+
+
+def register_header_pseudonyms(
+    field: str, aliases: Iterable[str], scale: Union[float, None] = None
+):
+    """
+    Add header names that translate to field.
+    :param str field: standard field name, refdes, x, y, rotation, side, case is ignored
+    :param aliases: header names, case, spaces, dashes and underscores are ignored.
+        An alias already registered moves to field.
+    :param float scale: multiplier from the values in these columns to mm or degrees,
+        None to use the default units. Only x, y and rotation can be scaled.
+    """
+    field = field.strip().lower()
+    if field not in _HEADER_PSEUDONYMS:
+        msg = f"Unknown header field {field!r}, expected one of {', '.join(_HEADER_PSEUDONYMS)}"
+        raise ValueError(msg)
+    if scale is not None and field not in _SCALED_FIELDS:
+        msg = f"A scale can't be applied to {field}, only to {', '.join(_SCALED_FIELDS)}"
+        raise ValueError(msg)
+    for alias in aliases:
+        alias = _normalize_header_name(alias)
+        if not alias:
+            continue
+        previous = _PSEUDONYMS_INVERT.get(alias)
+        if previous is not None and previous[0] != field:
+            _HEADER_PSEUDONYMS[previous[0]].remove(alias)
+        if alias not in _HEADER_PSEUDONYMS[field]:
+            _HEADER_PSEUDONYMS[field].append(alias)
+        _PSEUDONYMS_INVERT[alias] = (field, scale)
+    _resolve_header.cache_clear()
+
+
+def load_header_pseudonyms(fname: str, **kwargs):
+    """
+    Register the header pseudonyms in a spreadsheet with field and alias
+    columns and an optional scale column. Rows without an alias are skipped.
+    """
+    from . import file_io
+
+    pseudonyms_df = file_io.read_file_to_df(fname, **kwargs)
+    pseudonyms_df.columns = [pt.lower().strip() for pt in pseudonyms_df.columns]
+    if "scale" not in pseudonyms_df.columns:
+        pseudonyms_df["scale"] = None
+    for line in pseudonyms_df.itertuples(index=False):
+        if pd.isna(line.alias):
+            continue
+        scale = None if pd.isna(line.scale) else float(line.scale)
+        register_header_pseudonyms(str(line.field), [str(line.alias)], scale)
+
+
+def _resolve_column(col: str) -> Tuple[str, Union[float, None], Union[str, None]]:
+    """
+    Standard name, registered scale and header unit of a column
+    """
+    field = _PSEUDONYMS_INVERT.get(_normalize_header_name(col))
+    if field is not None:
+        return field[0], field[1], None
+
+    match = _UNIT_SUFFIX.match(col.lower().strip())
+    if match is None:
+        return col, None, None
+    field = _PSEUDONYMS_INVERT.get(_normalize_header_name(match.group("name")))
+    unit = match.group("bracketed") or match.group("separated")
+    if field is None:
+        return col, None, None
+    if field[0] in _LENGTH_FIELDS and unit in coordinates.NM_PER_UNIT:
+        return field[0], field[1], unit
+    if field[0] == "rotation" and unit in _ANGLE_SCALES:
+        return field[0], (field[1] or 1.0) * _ANGLE_SCALES[unit], None
+    return col, None, None
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_header(header: Tuple[str, ...]) -> Tuple[Tuple, Tuple, Tuple]:
+    """
+    Standard names, scales and units of a header, memoized per distinct header
+    """
+    return tuple(zip(*(_resolve_column(col) for col in header))) or ((), (), ())
+
+
 def translate_header(header):
     """
     Translate the header to a standardized form.
     If the tag cannot be found then just return it unchanged
     """
+    return _resolve_header(tuple(header))[0]
+
 
-    header_dict = {col.lower().replace(" ", ""): col for col in header}
-    return tuple([_PSEUDONYMS_INVERT.get(key, header_dict[key]) for key in header_dict])
+def is_config_column(name: str) -> bool:
+    """
+    True if the column name translates to one of the standard fields,
+    used to only read the columns setup_dataframe needs
+    """
+    return translate_header([name.lower().strip()])[0] in _HEADER_PSEUDONYMS
 
 
-def setup_dataframe(components_df):
+def setup_dataframe(components_df, copy: bool = True, units: str = "mm"):
     """
-    Change the dataframe into a standard form
+    Change the dataframe into a standard form, rotation in degrees.
+    The units of the positions are recorded in components_df.attrs["units"],
+    see coordinates.get_units.
+    :param bool copy: work on a copy, set to False to modify components_df in place
+    :param str units: units of x and y columns without a unit in the header
     """
-    components_df = copy.deepcopy(components_df)
-    components_df.columns = [pt.lower().strip() for pt in components_df.columns]
-    components_df.columns = translate_header(components_df.columns)
+    if copy:
+        components_df = components_df.copy()
+    if units not in coordinates.NM_PER_UNIT:
+        msg = f"Unknown units {units}, expected one of {', '.join(coordinates.NM_PER_UNIT)}"
+        raise ValueError(msg)
+    columns, scales, header_units = _resolve_header(
+        tuple(pt.lower().strip() for pt in components_df.columns)
+    )
+    components_df.columns = columns
+
+    # Positions stay in the units they were given in so the conversion to nm
+    # rounds the same as KiCad. If x and y differ, or a registered scale applies,
+    # they are converted to nm here instead.
+    lengths = {}
+    for column, scale, unit in zip(columns, scales, header_units):
+        if column in _LENGTH_FIELDS:
+            # a registered scale is to mm unless the header gives a unit
+            lengths[column] = (scale, unit or ("mm" if scale is not None else units))
+        elif scale is not None and scale != 1.0:
+            components_df[column] = components_df[column].astype(float) * scale
+
+    length_units = {unit for scale, unit in lengths.values()}
+    if len(length_units) > 1 or any(scale is not None for scale, unit in lengths.values()):
+        for column, (scale, unit) in lengths.items():
+            values = components_df[column].astype(float)
+            if scale is not None:
+                values = values * scale
+            components_df[column] = coordinates.to_nm(values, unit)
+        units = "nm"
+    elif length_units:
+        units = length_units.pop()
+    components_df.attrs["units"] = units
 
     if "rotation" not in components_df.columns:
         components_df["rotation"] = [0] * len(components_df)
@@ -73,6 +220,9 @@ def setup_dataframe(components_df):
 
     sides = []
     for pt in components_df["side"]:
+        if isinstance(pt, SideEnum):
+            sides.append(pt)
+            continue
         try:
             sides.append(reverse_pseudonyms[pt.lower().strip()])
         except KeyError:
@@ -125,6 +275,58 @@ def get_missing_references(board: pcbnew.BOARD, components_df):
     return missing_modules
 
 
+class FootprintIndex(dict):
+    """
+    Map of reference designator to footprint with the layer ID of each
+    footprint cached in layers, kept up to date by _flip_footprint
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.layers = {}
+
+
+def get_footprint_index(board: pcbnew.BOARD) -> FootprintIndex:
+    """
+    Map of reference designator to footprint, avoids a search of the board
+    for every part. The first footprint with a reference is kept.
+    """
+    footprints = FootprintIndex()
+    for module in board.GetFootprints():
+        ref_des = module.GetReference()
+        if ref_des not in footprints:
+            footprints[ref_des] = module
+            footprints.layers[ref_des] = module.GetLayer()
+    return footprints
+
+
+def _get_layers(components_df, footprints: dict) -> np.ndarray:
+    """
+    Layer ID of the footprint of each row, -1 if missing. Read from the
+    cached layers of a FootprintIndex, or from the footprints of a plain dict
+    """
+    layers = getattr(footprints, "layers", None)
+    if layers is None:
+        return np.array(
+            [
+                module.GetLayer() if module is not None else -1
+                for module in map(footprints.get, components_df["refdes"])
+            ],
+            dtype=np.int64,
+        )
+    return np.fromiter(
+        (layers.get(ref_des, -1) for ref_des in components_df["refdes"]),
+        dtype=np.int64,
+        count=len(components_df),
+    )
+
+
+def _find_footprint(board: pcbnew.BOARD, ref_des: str, footprints: Union[dict, None]):
+    if footprints is not None:
+        return footprints.get(ref_des)
+    return board.FindFootprintByReference(ref_des)
+
+
 import enum
 
 
@@ -134,17 +336,20 @@ class FLIP_DIRECTION(enum.IntEnum):
 
 
 def flip_module(
-    ref_des: str, board: pcbnew.BOARD, side: SideEnum = SideEnum.top
+    ref_des: str,
+    board: pcbnew.BOARD,
+    side: SideEnum = SideEnum.top,
+    footprints: Union[dict, None] = None,
 ) -> pcbnew.BOARD:
     """
     Move and rotate a part on a board
     :param str ref_def: Reference Designator of part
     :param pcbnew.BOARD board: Target board
     :param bool side: front, back, current
+    :param dict footprints: optional index from get_footprint_index
     """
-    print(side, type(side))
     assert isinstance(side, SideEnum)
-    module = board.FindFootprintByReference(ref_des)
+    module = _find_footprint(board, ref_des, footprints)
     if module is None:
         _log.warning("%s not found", ref_des)
         return None
@@ -157,28 +362,82 @@ def flip_module(
 
     # Set the correct side of the part, reflected over the y axis, correct the rotation later
     _log.debug("Side: %s", side)
-    if (side == SideEnum.top and module.GetLayerName() != "F.Cu") or (
-        side == SideEnum.bottom and module.GetLayerName() == "F.Cu"
-    ):
-        _log.debug(f"Flip {ref_des}")
-        kwargs = {"aFlipLeftRight": True}
-        if pcbnew.Version()[0] == "9":
-            kwargs = {"aFlipDirection": int(FLIP_DIRECTION.TOP_BOTTOM)}
-
-        module.Flip(module.GetCenter(), **kwargs)
+    on_top = module.GetLayer() == pcbnew.F_Cu
+    if (side == SideEnum.top and not on_top) or (side == SideEnum.bottom and on_top):
+        _flip_footprint(ref_des, module, footprints)
 
     return board
 
 
+@functools.lru_cache(maxsize=None)
+def _flip_kwargs() -> dict:
+    """
+    Flip arguments for the running KiCad version, resolved once
+    """
+    if pcbnew.Version()[0] == "9":
+        return {"aFlipDirection": int(FLIP_DIRECTION.TOP_BOTTOM)}
+    return {"aFlipLeftRight": True}
+
+
+def flip_mirrors_x() -> bool:
+    """
+    True if _flip_footprint mirrors footprints left to right, negating x,
+    False if it mirrors them top to bottom, negating y
+    """
+    kwargs = _flip_kwargs()
+    if "aFlipDirection" in kwargs:
+        return kwargs["aFlipDirection"] == int(FLIP_DIRECTION.LEFT_RIGHT)
+    return kwargs["aFlipLeftRight"]
+
+
+def _flip_footprint(ref_des: str, module, footprints: Union[dict, None] = None) -> bool:
+    """
+    Flip a footprint to the other side about its center, locked parts are skipped
+    :param dict footprints: index from get_footprint_index, its cached layer is updated
+    """
+    if module.IsLocked():
+        _log.info("%s locked, skip", ref_des)
+        return False
+    _log.debug("Flip %s", ref_des)
+    module.Flip(module.GetCenter(), **_flip_kwargs())
+    layers = getattr(footprints, "layers", None)
+    if layers is not None:
+        layers[ref_des] = module.GetLayer()
+    return True
+
+
+def get_flip_mask(components_df, footprints: dict) -> np.ndarray:
+    """
+    Boolean mask of the rows of a standardized dataframe whose footprint
+    is on the other side to the one requested. Missing footprints are False.
+    A reference listed more than once is only flipped for its last row,
+    the same row that sets its final position.
+    :param dict footprints: index from get_footprint_index, using its cached layers
+    """
+    layers = _get_layers(components_df, footprints)
+    found = layers >= 0
+    on_top = layers == pcbnew.F_Cu
+    side = components_df["side"].to_numpy()
+    last = ~components_df["refdes"].duplicated(keep="last").to_numpy()
+    return last & found & (
+        ((side == SideEnum.top) & ~on_top) | ((side == SideEnum.bottom) & on_top)
+    )
+
+
 def move_module(
-    ref_des: str, position: tuple, rotation: float, board: pcbnew.BOARD
+    ref_des: str,
+    position: tuple,
+    rotation: float,
+    board: pcbnew.BOARD,
+    footprints: Union[dict, None] = None,
 ) -> pcbnew.BOARD:
     """
     Move and rotate a part on a board
     :param str ref_def: Reference Designator of part
-    :param tuple(float x, float y) position: Desired center of part in mm
+    :param tuple(int x, int y) position: Desired position of part in nm
     :param float rotation: Desired rotation of part
     :param pcbnew.BOARD board: Target board
+    :param dict footprints: optional index from get_footprint_index
 
     Read the footprints reference
     If the refdes is in components["refdes"] then enter to update
@@ -186,7 +445,7 @@ def move_module(
     Update the label to with a configuration table passed to a function
     """
 
-    module = board.FindFootprintByReference(ref_des)
+    module = _find_footprint(board, ref_des, footprints)
     if module is None:
         _log.warning("%s not found", ref_des)
         return None
@@ -254,58 +513,67 @@ def group_parts(
         return board
 
     assert isinstance(group_name, str)
+    group = _new_group(board, group_name)
+    _add_to_group(board, group, components_df["refdes"])
+    return board
+
+
+def _new_group(board: pcbnew.BOARD, group_name: str) -> pcbnew.PCB_GROUP:
     group = pcbnew.PCB_GROUP(None)
     group.SetName(group_name)
     board.Add(group)
-    for _, component in components_df.iterrows():
-        ref_des = component["refdes"]
-        module = board.FindFootprintByReference(ref_des)
-        if module is not None:
-            group.AddItem(module)
-
-    return board
+    return group
 
 
-from typing import Any
+def _find_group(board: pcbnew.BOARD, group_name: str) -> pcbnew.PCB_GROUP:
+    for group in board.Groups():
+        if group.GetName() == group_name:
+            return group
+    return _new_group(board, group_name)
 
 
-def _place_part(
-    board: pcbnew.BOARD, component: dict[str, Any], origin: tuple[float, float] = (0, 0)
-):
-    location = (component["x"], component["y"])
-    #  Scale input to kicad native units
-    x_mm = pcbnew.FromMM(float(location[0]) + origin[0])
-
-    # cartesian -> pixel
-    y_mm = pcbnew.FromMM(-1 * float(location[1]) + origin[1])
-    ref_des = component["refdes"]
+def add_to_group(
+    board: pcbnew.BOARD,
+    group_name: str,
+    refs,
+    footprints: Union[dict, None] = None,
+) -> pcbnew.BOARD:
+    """
+    Add parts to the group named group_name, creating it if the board has none
+    :param: dict footprints: index from get_footprint_index, searched on the board if not given
+    """
+    _add_to_group(board, _find_group(board, group_name), refs, footprints)
+    return board
 
-    if x_mm < 0 or y_mm < 0:
-        raise ValueError(
-            f"Placement of REF {ref_des} outside of legal range. Origin: {origin}, location: {location} -> ({x_mm}, {y_mm})"
-        )
-    assert x_mm >= 0
-    assert y_mm >= 0
-    flip_module(ref_des, side=component["side"], board=board)
-    move_module(ref_des, (x_mm, y_mm), component["rotation"], board=board)
 
-    return board
+def _add_to_group(
+    board: pcbnew.BOARD,
+    group: pcbnew.PCB_GROUP,
+    refs,
+    footprints: Union[dict, None] = None,
+) -> None:
+    for ref_des in refs:
+        module = _find_footprint(board, ref_des, footprints)
+        if module is not None:
+            group.AddItem(module)
 
 
 def place_parts(
     board: pcbnew.BOARD,
     components_df,
     origin: Tuple[float, float] = (0, 0),
+    origin_nm: Union[Tuple[int, int], None] = None,
+    footprints: Union[dict, None] = None,
 ) -> pcbnew.BOARD:
     """
     :param: pcbnew.BOARD board:
-    :param: str group_name:
-    :param: bool mirror: reflect parts over y axis
     :param: origin: reference point in mm
+    :param: origin_nm: reference point in nm, overrides origin, see coordinates.get_origin_nm
+    :param: dict footprints: index from get_footprint_index, built if not given
 
     Done as if looking down on the top of the board.
     Input can either be absolute or aux origin.
-    The input must be in cartesian coordinates.
+    The input must be in cartesian coordinates, in the units recorded by setup_dataframe or mm.
     Check that all the mapped output are within the positive natural coordinates.
     """
     # Short circuit exit if there are no components
@@ -314,22 +582,102 @@ def place_parts(
         _log.warning("No parts in dataframe")
         return board
 
-    for _, component in components_df.iterrows():
-        _place_part(board=board, component=component, origin=origin)
+    if origin_nm is None:
+        origin_nm = coordinates.get_origin_from_mm(origin)
+
+    # Scale the whole input to kicad native units at once, cartesian -> pixel
+    x_nm, y_nm = coordinates.to_board_coordinates(
+        components_df["x"], components_df["y"], origin_nm, coordinates.get_units(components_df)
+    )
+    outside = (x_nm < 0) | (y_nm < 0)
+    if outside.any():
+        i = int(outside.argmax())
+        component = components_df.iloc[i]
+        msg = (
+            f"Placement of REF {component['refdes']} outside of legal range. "
+            f"Origin: {origin_nm} nm, location: ({component['x']}, {component['y']}) -> ({x_nm[i]}, {y_nm[i]})"
+        )
+        raise ValueError(msg)
+
+    if footprints is None:
+        footprints = get_footprint_index(board)
+
+    # Only visit the parts on the wrong side, flipping before moving
+    flip_mask = get_flip_mask(components_df, footprints)
+    for ref_des in components_df["refdes"].to_numpy()[flip_mask]:
+        _flip_footprint(ref_des, footprints[ref_des], footprints)
+
+    for ref_des, x, y, rotation in zip(
+        components_df["refdes"], x_nm.tolist(), y_nm.tolist(), components_df["rotation"]
+    ):
+        move_module(ref_des, (x, y), rotation, board=board, footprints=footprints)
 
     return board
 
 
+def place_parts_chunked(
+    board: pcbnew.BOARD,
+    chunks: Iterable,
+    origin: Tuple[float, float] = (0, 0),
+    group_name: Union[str, None] = None,
+    mirror: bool = False,
+    origin_nm: Union[Tuple[int, int], None] = None,
+    units: str = "mm",
+) -> Tuple[bool, list]:
+    """
+    Standardize, check and place one dataframe chunk at a time, adding the parts
+    to a single group. Only the current chunk is held in memory.
+    Stops at the first chunk with errors, the board is then partially placed.
+
+    :param: bool mirror: place the parts reflected over the y axis, as mirror_parts
+    :param: str units: units of x and y columns without a unit in the header
+    :returns: success and the errors
+    """
+    if group_name is None:
+        group_name = ""
+
+    footprints = get_footprint_index(board)
+    group = None
+    count = 0
+    for chunk in chunks:
+        components_df = setup_dataframe(chunk, copy=False, units=units)
+        input_valid, input_errors = check_input_valid(components_df)
+        if not input_valid:
+            return False, input_errors
+
+        if mirror:
+            components_df = mirror_components(components_df)
+        place_parts(
+            board, components_df, origin, origin_nm=origin_nm, footprints=footprints
+        )
+
+        if len(components_df) and group is None:
+            group = _new_group(board, group_name)
+        if group is not None:
+            _add_to_group(board, group, components_df["refdes"], footprints)
+        count += len(components_df)
+        _log.debug("%d parts placed", count)
+
+    if count == 0:
+        _log.warning("No parts in dataframe")
+    return True, []
+
+
+def mirror_components(components_df):
+    """
+    Copy of a standardized dataframe reflected over the y axis
+    """
+    return components_df.assign(x=-components_df["x"])
+
+
 def mirror_parts(
     board: pcbnew.BOARD,
     components_df,
     origin: tuple[float, float] = (0, 0),
+    origin_nm: Union[Tuple[int, int], None] = None,
 ):
     """
     Mirror parts in an entire dataframe
     """
-
-    components_df = copy.deepcopy(components_df)
-    components_df["x"] = [-1 * pt for pt in components_df["x"]]
-    place_parts(board, components_df, origin)
+    place_parts(board, mirror_components(components_df), origin, origin_nm=origin_nm)
     return board
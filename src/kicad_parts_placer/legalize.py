@@ -0,0 +1,284 @@
+"""
+legalize.py: Resolve overlapping parts by nudging them on a grid
+
+Parts are inserted one at a time into a spatial hash with a cell size of the
+median part extent. Each part is stored in every cell its box covers, so an
+overlap check only looks at the cells under the part being placed. Parts many
+cells across are kept in a short list checked against every part instead.
+Each copper side has its own hash, through hole parts are in both.
+A part that conflicts with one already placed is moved to the nearest free
+grid position around its requested location.
+"""
+
+import logging
+import math
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import pcbnew
+
+from . import coordinates, file_io
+from .kicad_parts_placer import SideEnum, flip_mirrors_x, get_footprint_index
+
+_log = logging.getLogger("kicad_parts_placer")
+
+_REPORT_COLUMNS = ["refdes", "x", "y", "new_x", "new_y", "displacement"]
+
+# parts more than this many cells across go in the oversize list
+_OVERSIZE_CELLS = 4
+
+
+_HOLE_PADS = (pcbnew.PAD_ATTRIB_PTH, pcbnew.PAD_ATTRIB_NPTH)
+
+
+def _optional_column(components_df, column: str, default=0.0) -> list:
+    if column not in components_df.columns:
+        return [default] * len(components_df)
+    values = components_df[column]
+    if isinstance(default, bool):
+        return values.fillna(default).astype(bool).tolist()
+    return values.astype(float).fillna(default).tolist()
+
+
+def _is_through_hole(module) -> bool:
+    """
+    True if the footprint has pads drilled through both sides, from its
+    attributes or, when it isn't marked SMD, from its pads
+    """
+    attributes = module.GetAttributes()
+    if attributes & pcbnew.FP_THROUGH_HOLE:
+        return True
+    if attributes & pcbnew.FP_SMD:
+        return False
+    return any(pad.GetAttribute() in _HOLE_PADS for pad in module.Pads())
+
+
+def add_footprint_extents(board: pcbnew.BOARD, components_df) -> pd.DataFrame:
+    """
+    Add width and height columns, in the units of the positions, from the pad
+    extents of each footprint on the board, rotated to the requested rotation, and
+    offset_x, offset_y of the pad box center from the footprint position.
+    The pad box is measured from the footprint origin, which is not the center
+    of footprints such as pin 1 origin connectors.
+    Also adds on_top, the side the part ends up on, and through_hole.
+    Parts missing from the board get a zero extent.
+    """
+    footprints = get_footprint_index(board)
+    widths_nm = []
+    heights_nm = []
+    centers_x_nm = []
+    centers_y_nm = []
+    on_top = []
+    through_hole = []
+    for ref_des, side in zip(components_df["refdes"], components_df["side"]):
+        module = footprints.get(ref_des)
+        if module is None:
+            widths_nm.append(0)
+            heights_nm.append(0)
+            centers_x_nm.append(0)
+            centers_y_nm.append(0)
+            on_top.append(side != SideEnum.bottom)
+            through_hole.append(False)
+            continue
+        bbox = module.GetFpPadsLocalBbox()
+        center = bbox.GetCenter()
+        widths_nm.append(bbox.GetWidth())
+        heights_nm.append(bbox.GetHeight())
+        centers_x_nm.append(center.x)
+        centers_y_nm.append(center.y)
+        if side == SideEnum.current:
+            on_top.append(footprints.layers[ref_des] == pcbnew.F_Cu)
+        else:
+            on_top.append(side == SideEnum.top)
+        through_hole.append(_is_through_hole(module))
+
+    units = coordinates.get_units(components_df)
+    width = coordinates.from_nm(widths_nm, units)
+    height = coordinates.from_nm(heights_nm, units)
+    # The local box is as if on the front, mirror it for parts that end up on
+    # the bottom along the same axis as the flip, then to cartesian orientation
+    on_top = np.array(on_top, dtype=bool)
+    mirror = np.where(on_top, 1, -1)
+    if flip_mirrors_x():
+        center_x = mirror * coordinates.from_nm(centers_x_nm, units)
+        center_y = -coordinates.from_nm(centers_y_nm, units)
+    else:
+        center_x = coordinates.from_nm(centers_x_nm, units)
+        center_y = -mirror * coordinates.from_nm(centers_y_nm, units)
+    angle = np.radians(components_df["rotation"].astype(float).to_numpy())
+    cos, sin = np.cos(angle), np.sin(angle)
+
+    components_df = components_df.copy()
+    components_df["width"] = width * np.abs(cos) + height * np.abs(sin)
+    components_df["height"] = width * np.abs(sin) + height * np.abs(cos)
+    components_df["offset_x"] = center_x * cos - center_y * sin
+    components_df["offset_y"] = center_x * sin + center_y * cos
+    components_df["on_top"] = on_top
+    components_df["through_hole"] = through_hole
+    return components_df
+
+
+def _candidate_steps(max_steps: int) -> list[tuple[int, int]]:
+    steps = [
+        (i, j)
+        for i in range(-max_steps, max_steps + 1)
+        for j in range(-max_steps, max_steps + 1)
+        if (i, j) != (0, 0)
+    ]
+    return sorted(steps, key=lambda step: step[0] ** 2 + step[1] ** 2)
+
+
+def legalize_placement(
+    components_df,
+    grid: float = 0.5,
+    clearance: float = 0.0,
+    max_steps: int = 20,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Move overlapping parts the smallest number of grid steps needed to clear
+    the parts before them in the dataframe.
+
+    Parts only conflict with parts on the same side of the board, unless
+    either one is through hole.
+
+    :param components_df: standardized dataframe with width and height columns,
+        and optionally offset_x and offset_y of the box center from the part position,
+        in the same units as the positions, and on_top and through_hole columns,
+        see add_footprint_extents. Parts without them are on the top and SMD.
+    :param float grid: step size in mm
+    :param float clearance: extra space required between parts in mm
+    :param int max_steps: furthest a part is moved in grid steps along each axis
+    :returns: the updated dataframe and a report of the moved parts in the position units
+    """
+    assert grid > 0
+    # grid and clearance to the units of the positions
+    to_units = coordinates.NM_PER_UNIT["mm"] / coordinates.NM_PER_UNIT[coordinates.get_units(components_df)]
+    grid *= to_units
+    clearance *= to_units
+    report = []
+    if len(components_df) == 0:
+        return components_df.copy(), pd.DataFrame(report, columns=_REPORT_COLUMNS)
+
+    # plain lists, element access in the loop is much faster than on arrays
+    x = components_df["x"].astype(float).tolist()
+    y = components_df["y"].astype(float).tolist()
+    half_width = (components_df["width"].astype(float).fillna(0) / 2).tolist()
+    half_height = (components_df["height"].astype(float).fillna(0) / 2).tolist()
+    offset_x = _optional_column(components_df, "offset_x")
+    offset_y = _optional_column(components_df, "offset_y")
+    on_top = _optional_column(components_df, "on_top", True)
+    through_hole = _optional_column(components_df, "through_hole", False)
+    placed_x = list(x)
+    placed_y = list(y)
+
+    # Cells sized to a typical part, parts much larger than that are kept in a
+    # short separate list so they don't force large cells on everything else
+    extents = [2 * max(w, h) for w, h in zip(half_width, half_height)]
+    cell_size = max(float(np.median(extents)) + clearance, grid)
+    oversize_extent = _OVERSIZE_CELLS * cell_size
+    # one hash per copper side, through hole parts are stored on both
+    cells: dict[bool, dict[tuple[int, int], list[int]]] = {True: {}, False: {}}
+    placed: dict[bool, list[int]] = {True: [], False: []}
+    oversize: dict[bool, list[int]] = {True: [], False: []}
+
+    def get_sides(i):
+        return (True, False) if through_hole[i] else (on_top[i],)
+
+    def get_cells(i, px, py, margin):
+        cx = px + offset_x[i]
+        cy = py + offset_y[i]
+        x0 = math.floor((cx - half_width[i] - margin) / cell_size)
+        x1 = math.floor((cx + half_width[i] + margin) / cell_size)
+        y0 = math.floor((cy - half_height[i] - margin) / cell_size)
+        y1 = math.floor((cy + half_height[i] + margin) / cell_size)
+        return [(ix, iy) for ix in range(x0, x1 + 1) for iy in range(y0, y1 + 1)]
+
+    def overlaps(i, px, py, j):
+        return abs(px + offset_x[i] - placed_x[j] - offset_x[j]) < half_width[i] + half_width[
+            j
+        ] + clearance and abs(py + offset_y[i] - placed_y[j] - offset_y[j]) < half_height[
+            i
+        ] + half_height[j] + clearance
+
+    def conflicts(i, px, py):
+        for side in get_sides(i):
+            if any(overlaps(i, px, py, j) for j in oversize[side]):
+                return True
+            if extents[i] > oversize_extent:
+                if any(overlaps(i, px, py, j) for j in placed[side]):
+                    return True
+                continue
+            # parts are stored in every cell they cover, so any overlapping part
+            # shares a cell with this part's box grown by the clearance
+            side_cells = cells[side]
+            for cell in get_cells(i, px, py, clearance):
+                for j in side_cells.get(cell, ()):
+                    if overlaps(i, px, py, j):
+                        return True
+        return False
+
+    def insert(i):
+        for side in get_sides(i):
+            if extents[i] > oversize_extent:
+                oversize[side].append(i)
+                continue
+            placed[side].append(i)
+            side_cells = cells[side]
+            for cell in get_cells(i, placed_x[i], placed_y[i], 0):
+                side_cells.setdefault(cell, []).append(i)
+
+    steps = None
+    refs = components_df["refdes"].tolist()
+    for i in range(len(components_df)):
+        if conflicts(i, x[i], y[i]):
+            if steps is None:
+                steps = _candidate_steps(max_steps)
+            for step_x, step_y in steps:
+                px = x[i] + step_x * grid
+                py = y[i] + step_y * grid
+                if not conflicts(i, px, py):
+                    placed_x[i] = px
+                    placed_y[i] = py
+                    report.append(
+                        {
+                            "refdes": refs[i],
+                            "x": x[i],
+                            "y": y[i],
+                            "new_x": px,
+                            "new_y": py,
+                            "displacement": math.hypot(px - x[i], py - y[i]),
+                        }
+                    )
+                    _log.info("%s moved from (%s, %s) to (%s, %s)", refs[i], x[i], y[i], px, py)
+                    break
+            else:
+                _log.warning("%s: no free position within %d grid steps", refs[i], max_steps)
+
+        insert(i)
+
+    components_df = components_df.copy()
+    components_df["x"] = placed_x
+    components_df["y"] = placed_y
+    return components_df, pd.DataFrame(report, columns=_REPORT_COLUMNS)
+
+
+def legalize_board(
+    board: pcbnew.BOARD,
+    components_df,
+    grid: float = 0.5,
+    clearance: float = 0.0,
+    report: Union[str, None] = None,
+) -> pd.DataFrame:
+    """
+    Legalize a standardized dataframe using the footprint extents on board
+    :param str report: spreadsheet to write the moved parts to
+    :returns: the updated dataframe
+    """
+    components_df, moved = legalize_placement(
+        add_footprint_extents(board, components_df), grid=grid, clearance=clearance
+    )
+    _log.info("Legalization moved %d parts", len(moved))
+    if report is not None:
+        file_io.write(moved, report, index=False)
+    return components_df
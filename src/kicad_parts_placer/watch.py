@@ -0,0 +1,158 @@
+"""
+watch.py: Re-apply placement when the config file changes
+
+The board and its footprint index stay in memory. When the config is saved
+the whole file is read again and only the rows that changed since the last pass are
+placed before the board is written out.
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Tuple, Union
+
+import pandas as pd
+import pcbnew
+
+from . import file_io
+from .kicad_parts_placer import (
+    add_to_group,
+    check_input_valid,
+    get_footprint_index,
+    is_config_column,
+    mirror_components,
+    place_parts,
+    setup_dataframe,
+)
+
+_log = logging.getLogger("kicad_parts_placer")
+
+_COMPARED_COLUMNS = ["refdes", "x", "y", "rotation", "side"]
+
+
+def diff_components(previous_df, components_df) -> pd.DataFrame:
+    """
+    Rows of a standardized dataframe that are new or differ from previous_df
+    in position, rotation or side
+    """
+    if previous_df is None or len(previous_df) == 0:
+        return components_df
+    previous = previous_df[_COMPARED_COLUMNS].drop_duplicates("refdes", keep="last")
+    merged = components_df[_COMPARED_COLUMNS].merge(
+        previous, on="refdes", how="left", suffixes=("", "_previous")
+    )
+    changed = merged["x_previous"].isna().to_numpy().copy()
+    for column in _COMPARED_COLUMNS[1:]:
+        changed |= (merged[column] != merged[f"{column}_previous"]).to_numpy()
+    return components_df[changed]
+
+
+def _mtime(fname: str) -> Union[int, None]:
+    try:
+        return os.stat(fname).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _wait_for_change(fname: str, last_mtime, interval: float, debounce: float):
+    """
+    Poll until the file modification time changes and then stays the same
+    for the debounce period, so a save in progress is not read
+    """
+    mtime = last_mtime
+    while mtime == last_mtime:
+        time.sleep(interval)
+        mtime = _mtime(fname)
+
+    stable_since = time.monotonic()
+    while time.monotonic() - stable_since < debounce:
+        time.sleep(interval)
+        current = _mtime(fname)
+        if current != mtime:
+            mtime = current
+            stable_since = time.monotonic()
+    return mtime
+
+
+def watch_config(
+    board: pcbnew.BOARD,
+    config: str,
+    out: str,
+    components_df,
+    group_name: str,
+    origin_nm: Tuple[int, int] = (0, 0),
+    units: str = "mm",
+    mirror: bool = False,
+    prepare: Union[Callable, None] = None,
+    interval: float = 0.1,
+    debounce: float = 0.3,
+) -> None:
+    """
+    Place the rows of config that change each time it is saved and save the board
+    to out. Runs until interrupted, a pass that fails is logged and skipped.
+
+    :param components_df: standardized dataframe already placed on the board
+    :param bool mirror: place the parts reflected over the y axis, as mirror_parts
+    :param prepare: optional function applied to each new standardized dataframe
+        before comparing, such as legalization
+    :param float debounce: seconds the config must be unchanged before it is read
+    """
+    footprints = get_footprint_index(board)
+    mtime = _mtime(config)
+    _log.info("Watching %s, Ctrl-C to stop", config)
+    try:
+        while True:
+            mtime = _wait_for_change(config, mtime, interval, debounce)
+            if mtime is None:
+                continue
+            try:
+                components_df = _apply_changes(
+                    board, config, out, components_df, footprints, group_name,
+                    origin_nm, units, mirror, prepare,
+                )
+            except Exception:
+                # a half edited or malformed config, wait for the next save
+                _log.exception("Applying %s failed", config)
+    except KeyboardInterrupt:
+        _log.info("Watch stopped")
+
+
+def _apply_changes(
+    board, config, out, components_df, footprints, group_name, origin_nm, units, mirror, prepare
+):
+    """
+    One pass of watch_config, returns the dataframe now placed on the board
+    """
+    start = time.monotonic()
+    new_df = setup_dataframe(
+        file_io.read_file_to_df(config, usecols=is_config_column),
+        copy=False,
+        units=units,
+    )
+    input_valid, input_errors = check_input_valid(new_df)
+    if not input_valid:
+        _log.error("\n".join(input_errors))
+        return components_df
+    if prepare is not None:
+        new_df = prepare(new_df)
+
+    changed = diff_components(components_df, new_df)
+    if len(changed) == 0:
+        _log.info("No placement changes")
+        return new_df
+
+    to_place = mirror_components(changed) if mirror else changed
+    place_parts(board, to_place, origin_nm=origin_nm, footprints=footprints)
+
+    added = set(changed["refdes"]).difference(components_df["refdes"])
+    if added:
+        add_to_group(board, group_name, sorted(added), footprints)
+
+    board.Save(out)
+    _log.info(
+        "%d parts placed, board saved %s in %.2fs",
+        len(changed),
+        out,
+        time.monotonic() - start,
+    )
+    return new_df
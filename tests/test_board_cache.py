@@ -0,0 +1,72 @@
+"""Tests for `kicad_parts_placer.board_cache`."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from kicad_parts_placer import board_cache
+
+_EXAMPLE_PCB = Path(__file__).parent.parent / "example" / "example-placement" / "example-placement.kicad_pcb"
+
+
+def _snapshot(refs):
+    snapshot = np.zeros(len(refs), dtype=board_cache._snapshot_dtype(8))
+    snapshot["refdes"] = refs
+    return snapshot
+
+
+class TestBoardCache(unittest.TestCase):
+    def test_find_footprint_offsets(self):
+        offsets = board_cache.find_footprint_offsets(str(_EXAMPLE_PCB))
+        data = _EXAMPLE_PCB.read_bytes()
+        assert "TP1" in offsets
+        assert data[offsets["TP1"]:].startswith(b"(footprint")
+        assert offsets["TP1"] < offsets["TP5"]
+
+    def test_read_footprint_names(self):
+        offsets = board_cache.find_footprint_offsets(str(_EXAMPLE_PCB))
+        snapshot = _snapshot(["TP1", "H1", "X1"])
+        snapshot["offset"] = [offsets["TP1"], offsets["H1"], -1]
+        names = board_cache.read_footprint_names(str(_EXAMPLE_PCB), snapshot)
+        self.assertEqual(
+            names,
+            ["Connector_PinHeader_2.54mm:PinHeader_1x01_P2.54mm_Vertical", "MountingHole:MountingHole_3.7mm_Pad_Via", ""],
+        )
+
+    def test_find_origin_nm(self):
+        self.assertEqual(board_cache.find_origin_nm(str(_EXAMPLE_PCB), "grid"), (148_750_000, 138_000_000))
+        self.assertEqual(board_cache.find_origin_nm(str(_EXAMPLE_PCB), "aux"), (0, 0))
+        self.assertEqual(board_cache.find_origin_nm(str(_EXAMPLE_PCB)), (0, 0))
+
+    def test_has_group(self):
+        placed = _EXAMPLE_PCB.with_name("example-placement_placed.kicad_pcb")
+        assert board_cache.has_group(str(placed), "centroid-all-pos")
+        assert not board_cache.has_group(str(placed), "centroid")
+        assert not board_cache.has_group(str(_EXAMPLE_PCB), "centroid-all-pos")
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pcb = Path(directory) / "board.kicad_pcb"
+            pcb.write_text("(kicad_pcb)")
+            assert board_cache.load_snapshot(str(pcb)) is None
+
+            board_cache.save_snapshot(_snapshot(["C1", "C2"]), str(pcb))
+            snapshot = board_cache.load_snapshot(str(pcb))
+            assert list(snapshot["refdes"]) == ["C1", "C2"]
+            # not mapped, so replacing the sidecar can't fail while it is in use
+            assert not isinstance(snapshot, np.memmap)
+
+            pcb.write_text("(kicad_pcb )")
+            assert board_cache.load_snapshot(str(pcb)) is None
+
+    def test_get_missing_references(self):
+        components_df = pd.DataFrame({"refdes": ["C1", "C3"]})
+        missing = board_cache.get_missing_references(_snapshot(["C1", "C2"]), components_df)
+        self.assertEqual(missing, ["C3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+"""Tests for `kicad_parts_placer.coordinates`."""
+
+import unittest
+
+import numpy as np
+
+from kicad_parts_placer import coordinates
+
+
+class TestCoordinates(unittest.TestCase):
+    def test_kiround_half_away_from_zero(self):
+        self.assertEqual(coordinates.kiround([0.5, 1.5, -0.5, -1.5, 0.4]).tolist(), [1, 2, -1, -2, 0])
+
+    def test_to_nm_units(self):
+        self.assertEqual(coordinates.to_nm([1.0, -2.54], "mm").tolist(), [1_000_000, -2_540_000])
+        self.assertEqual(coordinates.to_nm([100], "mil").tolist(), [2_540_000])
+        self.assertEqual(coordinates.to_nm([0.1], "inch").tolist(), [2_540_000])
+        assert coordinates.to_nm([1.0]).dtype == np.int64
+
+    def test_to_board_coordinates(self):
+        x_nm, y_nm = coordinates.to_board_coordinates([1.5], [2.0], origin_nm=(10_000_000, 20_000_000))
+        self.assertEqual(x_nm.tolist(), [11_500_000])
+        self.assertEqual(y_nm.tolist(), [18_000_000])
+
+    def test_from_nm(self):
+        self.assertEqual(coordinates.from_nm([2_540_000], "mil").tolist(), [100.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 """Tests for `kicad_parts_placer` package."""
 
+import importlib.util
 import unittest
 from kicad_parts_placer import file_io
 import tempfile
+import pandas as pd
+
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
 
 class TestFileIO(unittest.TestCase):
     def test_read_csv_to_df_comma(self):
@@ -55,6 +59,34 @@ class TestFileIO(unittest.TestCase):
             assert df.columns[0] == "hello"
             assert df.columns[1] == "world"
 
+    def test_read_file_to_df_chunks(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as tf:
+            with open(tf.name, "w") as f:
+                f.write("hello,world\n" + "".join(f"a{i},b{i}\n" for i in range(5)))
+
+            chunks = list(file_io.read_file_to_df_chunks(f.name, 2))
+            assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+            assert list(chunks[2].columns) == ["hello", "world"]
+            assert chunks[2]["hello"].iloc[0] == "a4"
+
+    @unittest.skipUnless(_HAS_PYARROW, "pyarrow not installed")
+    def test_arrow_formats_round_trip(self):
+        df = pd.DataFrame({"refdes": ["C1", "C2", "C3"], "x": [1.5, 2.0, 3.0], "notes": ["a", "b", "c"]})
+        for suffix in (".parquet", ".feather"):
+            with tempfile.TemporaryDirectory() as directory:
+                fname = f"{directory}/config{suffix}"
+                file_io.write(df, fname, index=False)
+
+                read = file_io.read_file_to_df(fname)
+                pd.testing.assert_frame_equal(read, df)
+
+                read = file_io.read_file_to_df(fname, usecols=lambda name: name != "notes")
+                assert list(read.columns) == ["refdes", "x"]
+
+                chunks = list(file_io.read_file_to_df_chunks(fname, 2, usecols=["x"]))
+                assert [len(chunk) for chunk in chunks] == [2, 1]
+                assert list(chunks[1]["x"]) == [3.0]
+
 
 if __name__ == "__main__":
     unittest.main()
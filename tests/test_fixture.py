@@ -0,0 +1,34 @@
+"""Tests for `kicad_parts_placer.fixture`."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from kicad_parts_placer import fixture, kicad_parts_placer
+
+_EXAMPLE_PCB = Path(__file__).parent.parent / "example" / "example-placement" / "example-placement.kicad_pcb"
+
+
+class TestFixture(unittest.TestCase):
+    def test_error_saves_neither_board(self):
+        # in range on the DUT board, mirrored out of range on the probe board
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"refdes": ["TP1"], "x": [10.0], "y": [-10.0]})
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            out = Path(directory) / "dut.kicad_pcb"
+            mirror_out = Path(directory) / "probe.kicad_pcb"
+            placed, errors = fixture.place_fixture(
+                str(_EXAMPLE_PCB), str(out), str(_EXAMPLE_PCB), str(mirror_out), components_df
+            )
+            self.assertFalse(placed)
+            self.assertEqual(len(errors), 2)
+            self.assertIn("outside of legal range", errors[1])
+            assert not out.exists()
+            assert not mirror_out.exists()
+
+
+if __name__ == "__main__":
+    unittest.main()
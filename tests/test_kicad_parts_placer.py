@@ -3,17 +3,90 @@
 import logging
 import tempfile
 import unittest
+from unittest import mock
 import pandas as pd
 
 from click.testing import CliRunner
 
-from kicad_parts_placer import cli, file_io, kicad_parts_placer
+from kicad_parts_placer import cli, coordinates, file_io, kicad_parts_placer
+import pcbnew
+
+
+class _Footprint:
+    def __init__(self, layer, ref_des=""):
+        self.layer = layer
+        self.ref_des = ref_des
+        self.position = None
+        self.rotation = None
+        self.layer_reads = 0
+
+    def GetReference(self):
+        return self.ref_des
+
+    def GetLayer(self):
+        self.layer_reads += 1
+        return self.layer
+
+    def IsLocked(self):
+        return False
+
+    def Flip(self, center, **kwargs):
+        self.layer = pcbnew.B_Cu if self.layer == pcbnew.F_Cu else pcbnew.F_Cu
+
+    def GetCenter(self):
+        return self.position
+
+    def SetPosition(self, position):
+        self.position = position
+
+    def SetOrientationDegrees(self, rotation):
+        self.rotation = rotation
+
+
+class _Group:
+    def __init__(self, group_name):
+        self.group_name = group_name
+        self.items = []
+
+    def AddItem(self, item):
+        self.items.append(item)
+
+
+class _Board:
+    def __init__(self, footprints):
+        self.footprints = footprints
+        self.groups = []
+
+    def GetFootprints(self):
+        return self.footprints
+
+    def FindFootprintByReference(self, ref_des):
+        return next((pt for pt in self.footprints if pt.ref_des == ref_des), None)
+
+
+def _new_group(board, group_name):
+    group = _Group(group_name)
+    board.groups.append(group)
+    return group
+
 
 class TestKicad_parts_placer(unittest.TestCase):
     """Tests for `kicad_parts_placer` package."""
 
     def setUp(self):
         """Set up test fixtures, if any."""
+        # tests may register header pseudonyms, restore the registry afterwards
+        pseudonyms = {key: list(aliases) for key, aliases in kicad_parts_placer._HEADER_PSEUDONYMS.items()}
+        invert = dict(kicad_parts_placer._PSEUDONYMS_INVERT)
+        self.addCleanup(self._restore_pseudonyms, pseudonyms, invert)
+
+    @staticmethod
+    def _restore_pseudonyms(pseudonyms, invert):
+        for key, aliases in pseudonyms.items():
+            kicad_parts_placer._HEADER_PSEUDONYMS[key][:] = aliases
+        kicad_parts_placer._PSEUDONYMS_INVERT.clear()
+        kicad_parts_placer._PSEUDONYMS_INVERT.update(invert)
+        kicad_parts_placer._resolve_header.cache_clear()
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
@@ -31,6 +104,15 @@ class TestKicad_parts_placer(unittest.TestCase):
         assert help_result.exit_code == 0
         assert "Show this message and exit." in help_result.output
 
+    def test_command_line_origin_flags_exclusive(self):
+        runner = CliRunner()
+        result = runner.invoke(
+            cli.main,
+            ["--pcb", "board.kicad_pcb", "--config", "parts.csv", "-i", "--drill_center", "--grid_origin"],
+        )
+        assert result.exit_code == 2
+        assert "--drill_center and --grid_origin" in result.output
+
     def test_translate_header(self):
         logging.info(kicad_parts_placer.translate_header(["ref des"]) )
         self.assertEqual(kicad_parts_placer.translate_header(["posx"]), ("x",))
@@ -48,6 +130,147 @@ class TestKicad_parts_placer(unittest.TestCase):
         self.assertEqual(kicad_parts_placer.translate_header(["ref des"]), ("refdes",))
         self.assertEqual(kicad_parts_placer.translate_header(["reference designator"]), ("refdes",))
 
+    def test_translate_header_units(self):
+        self.assertEqual(kicad_parts_placer.translate_header(["Center-X(mm)"]), ("x",))
+        self.assertEqual(kicad_parts_placer.translate_header(["PosY [mil]"]), ("y",))
+        self.assertEqual(kicad_parts_placer.translate_header(["pos_x"]), ("x",))
+        self.assertEqual(kicad_parts_placer.translate_header(["Package (mm)"]), ("Package (mm)",))
+
+    def test_setup_dataframe_unit_scaling(self):
+        components_df = pd.DataFrame({"Ref Des": ["C1"], "X (mil)": [1000], "Y [in]": [1], "Rot": [90]})
+        components_df = kicad_parts_placer.setup_dataframe(components_df)
+        # x and y in different units are converted to nm
+        self.assertEqual(components_df.attrs["units"], "nm")
+        self.assertEqual(components_df["x"][0], 25_400_000)
+        self.assertEqual(components_df["y"][0], 25_400_000)
+        self.assertEqual(components_df["rotation"][0], 90)
+
+    def test_setup_dataframe_keeps_units(self):
+        components_df = pd.DataFrame({"refdes": ["C1"], "x (mil)": [1.0025], "y (mil)": [-1.0025]})
+        components_df = kicad_parts_placer.setup_dataframe(components_df)
+        self.assertEqual(components_df.attrs["units"], "mil")
+        self.assertEqual(components_df["x"][0], 1.0025)
+        # 25463.5 nm, rounded half away from zero as KiCad does
+        x_nm, y_nm = coordinates.to_board_coordinates(
+            components_df["x"], components_df["y"], unit=coordinates.get_units(components_df)
+        )
+        self.assertEqual((x_nm[0], y_nm[0]), (25464, 25464))
+
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"refdes": ["C1"], "x": [1], "y": [2]}), units="inch"
+        )
+        self.assertEqual(components_df.attrs["units"], "inch")
+
+    def test_register_header_pseudonyms(self):
+        self.assertEqual(kicad_parts_placer.translate_header(["Probe Row"]), ("Probe Row",))
+        kicad_parts_placer.register_header_pseudonyms("y", ["probe row"], scale=2.54)
+        components_df = kicad_parts_placer.setup_dataframe(pd.DataFrame({"Probe Row": [2]}))
+        self.assertEqual(components_df.attrs["units"], "nm")
+        self.assertEqual(components_df["y"][0], 5_080_000)
+
+    def test_register_header_pseudonyms_unknown_field(self):
+        with self.assertRaisesRegex(ValueError, "'why'.*refdes, x, y, rotation, side"):
+            kicad_parts_placer.register_header_pseudonyms("why", ["probe row"])
+
+    def test_register_header_pseudonyms_moves_alias(self):
+        kicad_parts_placer.register_header_pseudonyms("Y", ["PX"])
+        kicad_parts_placer.register_header_pseudonyms("x", ["px"])
+        self.assertEqual(kicad_parts_placer.translate_header(["px"]), ("x",))
+        self.assertNotIn("px", kicad_parts_placer._HEADER_PSEUDONYMS["y"])
+        with self.assertRaisesRegex(ValueError, "side"):
+            kicad_parts_placer.register_header_pseudonyms("side", ["face"], scale=2.0)
+
+    def test_load_header_pseudonyms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fname = f"{directory}/headers.csv"
+            pd.DataFrame({
+                "Field": ["X", " refdes", "y", "rotation"],
+                "Alias": ["Center X", "Part", None, "Turn"],
+                "Scale": [None, None, 2.0, 90.0],
+            }).to_csv(fname, index=False)
+            kicad_parts_placer.load_header_pseudonyms(fname)
+        self.assertEqual(kicad_parts_placer.translate_header(["center x", "PART", "nan"]), ("x", "refdes", "nan"))
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"Part": ["C1"], "Center X": [1.5], "y": [2], "Turn": [1]})
+        )
+        self.assertEqual(components_df["x"][0], 1.5)
+        self.assertEqual(components_df["rotation"][0], 90)
+
+    def test_is_config_column(self):
+        self.assertTrue(kicad_parts_placer.is_config_column("Ref Des"))
+        self.assertTrue(kicad_parts_placer.is_config_column(" PosX"))
+        self.assertFalse(kicad_parts_placer.is_config_column("value"))
+
+    def test_get_flip_mask(self):
+        footprints = {"C1": _Footprint(pcbnew.F_Cu), "C2": _Footprint(pcbnew.B_Cu), "C3": _Footprint(pcbnew.F_Cu)}
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"refdes": ["C1", "C2", "C3", "C4"], "x": [0] * 4, "y": [0] * 4, "side": ["back", "front", "front", "back"]})
+        )
+        mask = kicad_parts_placer.get_flip_mask(components_df, footprints)
+        self.assertEqual(list(mask), [True, True, False, False])
+
+    def test_get_flip_mask_cached_layers(self):
+        board = _Board([_Footprint(pcbnew.F_Cu, "C1"), _Footprint(pcbnew.B_Cu, "C2")])
+        footprints = kicad_parts_placer.get_footprint_index(board)
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"refdes": ["C1", "C2"], "x": [0] * 2, "y": [0] * 2, "side": ["back", "back"]})
+        )
+        mask = kicad_parts_placer.get_flip_mask(components_df, footprints)
+        self.assertEqual(list(mask), [True, False])
+        self.assertEqual([pt.layer_reads for pt in board.footprints], [1, 1])
+
+        kicad_parts_placer._flip_footprint("C1", footprints["C1"], footprints)
+        self.assertEqual(footprints.layers["C1"], pcbnew.B_Cu)
+        mask = kicad_parts_placer.get_flip_mask(components_df, footprints)
+        self.assertEqual(list(mask), [False, False])
+
+    def test_get_flip_mask_duplicate_refdes(self):
+        footprints = {"C1": _Footprint(pcbnew.F_Cu)}
+        components_df = kicad_parts_placer.setup_dataframe(
+            pd.DataFrame({"refdes": ["C1", "C1", "C1"], "x": [0] * 3, "y": [0] * 3, "side": ["back", "back", "front"]})
+        )
+        mask = kicad_parts_placer.get_flip_mask(components_df, footprints)
+        self.assertEqual(list(mask), [False, False, False])
+        mask = kicad_parts_placer.get_flip_mask(components_df.iloc[:2], footprints)
+        self.assertEqual(list(mask), [False, True])
+
+    def _chunks(self, *rows):
+        for chunk in rows:
+            yield pd.DataFrame(chunk, columns=["refdes", "x", "y"])
+
+    def test_place_parts_chunked_single_group(self):
+        board = _Board([_Footprint(pcbnew.F_Cu, f"C{i}") for i in range(1, 5)])
+        chunks = self._chunks([("C1", 1.0, -1.0), ("C2", 2.0, -2.0)], [("C3", 3.0, -3.0), ("C4", 4.0, -4.0)])
+        with mock.patch.object(kicad_parts_placer, "_new_group", side_effect=_new_group):
+            valid, errors = kicad_parts_placer.place_parts_chunked(board, chunks, group_name="parts")
+        self.assertTrue(valid)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(board.groups), 1)
+        self.assertEqual(board.groups[0].group_name, "parts")
+        self.assertEqual([pt.ref_des for pt in board.groups[0].items], ["C1", "C2", "C3", "C4"])
+        self.assertEqual(board.footprints[3].rotation, 0.0)
+        assert board.footprints[3].position is not None
+
+    def test_place_parts_chunked_stops_at_invalid_chunk(self):
+        board = _Board([_Footprint(pcbnew.F_Cu, f"C{i}") for i in range(1, 5)])
+        chunks = self._chunks([("C1", 1.0, -1.0)], [(None, 2.0, -2.0), ("C3", 3.0, -3.0)], [("C4", 4.0, -4.0)])
+        with mock.patch.object(kicad_parts_placer, "_new_group", side_effect=_new_group):
+            valid, errors = kicad_parts_placer.place_parts_chunked(board, chunks, group_name="parts")
+        self.assertFalse(valid)
+        self.assertEqual(len(errors), 1)
+        # the first chunk stays placed, nothing after the invalid chunk is
+        self.assertEqual([pt.ref_des for pt in board.groups[0].items], ["C1"])
+        self.assertEqual([pt.position is not None for pt in board.footprints], [True, False, False, False])
+        # the remaining chunks are not read
+        self.assertEqual(len(list(chunks)), 1)
+
+    def test_mirror_components(self):
+        components_df = pd.DataFrame({"refdes": ["C1", "C2"], "x": [1.0, -2.0], "y": [2.0, 3.0]})
+        mirrored = kicad_parts_placer.mirror_components(components_df)
+        self.assertEqual(list(mirrored["x"]), [-1.0, 2.0])
+        self.assertEqual(list(mirrored["y"]), [2.0, 3.0])
+        self.assertEqual(list(components_df["x"]), [1.0, -2.0])
+
     def test_check_input_pass(self):
         components_df = pd.DataFrame({"refdes": ["C1", "C2"], "x": [1,2], "y": [2,3], "rotation": [0, 90], "side": ["front", "back"]})
         valid, errors = kicad_parts_placer.check_input_valid(components_df)
@@ -0,0 +1,149 @@
+"""Tests for `kicad_parts_placer.legalize`."""
+
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pandas as pd
+import pcbnew
+
+from kicad_parts_placer import legalize
+from kicad_parts_placer.kicad_parts_placer import SideEnum
+
+
+class _Box:
+    def __init__(self, x0, y0, x1, y1):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    def GetCenter(self):
+        return SimpleNamespace(x=(self.x0 + self.x1) // 2, y=(self.y0 + self.y1) // 2)
+
+    def GetWidth(self):
+        return self.x1 - self.x0
+
+    def GetHeight(self):
+        return self.y1 - self.y0
+
+
+class _Footprint:
+    """Pads 2 mm square, centered 1 mm right of and 1 mm above the origin"""
+
+    def __init__(self, ref_des, layer):
+        self.ref_des = ref_des
+        self.layer = layer
+
+    def GetReference(self):
+        return self.ref_des
+
+    def GetLayer(self):
+        return self.layer
+
+    def GetFpPadsLocalBbox(self):
+        return _Box(0, -2_000_000, 2_000_000, 0)
+
+    def GetAttributes(self):
+        return pcbnew.FP_SMD
+
+
+class _Board:
+    def __init__(self, footprints):
+        self.footprints = footprints
+
+    def GetFootprints(self):
+        return self.footprints
+
+
+class TestLegalize(unittest.TestCase):
+    def test_no_conflicts_unchanged(self):
+        components_df = pd.DataFrame({"refdes": ["TP1", "TP2"], "x": [0, 5], "y": [0, 0], "width": [2, 2], "height": [2, 2]})
+        placed, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(list(placed["x"]), [0, 5])
+        self.assertEqual(len(report), 0)
+
+    def test_overlap_moved_minimum_steps(self):
+        components_df = pd.DataFrame({"refdes": ["TP1", "TP2"], "x": [0, 1], "y": [0, 0], "width": [2, 2], "height": [2, 2]})
+        placed, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(list(placed["x"]), [0, 2])
+        self.assertEqual(list(placed["y"]), [0, 0])
+        self.assertEqual(list(report["refdes"]), ["TP2"])
+        self.assertAlmostEqual(report["displacement"][0], 1)
+
+    def test_clearance(self):
+        components_df = pd.DataFrame({"refdes": ["TP1", "TP2"], "x": [0, 2], "y": [0, 0], "width": [2, 2], "height": [2, 2]})
+        placed, report = legalize.legalize_placement(components_df, grid=0.5, clearance=0.5)
+        self.assertEqual(list(placed["x"]), [0, 2.5])
+        self.assertEqual(len(report), 1)
+
+    def test_grid_in_position_units(self):
+        components_df = pd.DataFrame({"refdes": ["TP1", "TP2"], "x": [0, 40], "y": [0, 0], "width": [80, 80], "height": [80, 80]})
+        components_df.attrs["units"] = "mil"
+        placed, report = legalize.legalize_placement(components_df, grid=2.54)
+        self.assertAlmostEqual(report["displacement"][0], 100)
+
+    def test_mixed_part_sizes(self):
+        # pins on a 2 mm pitch with a large connector among them, only the
+        # pins under the connector conflict
+        refs = [f"TP{i}" for i in range(100)]
+        xs = [2.0 * (i % 10) for i in range(100)]
+        ys = [2.0 * (i // 10) for i in range(100)]
+        components_df = pd.DataFrame({
+            "refdes": ["J1", *refs],
+            "x": [50.0, *xs],
+            "y": [50.0, *ys],
+            "width": [40.0, *[1.0] * 100],
+            "height": [40.0, *[1.0] * 100],
+        })
+        _, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(len(report), 0)
+
+        components_df.loc[0, ["x", "y"]] = [0.0, 0.0]
+        placed, report = legalize.legalize_placement(components_df, grid=0.5, max_steps=60)
+        self.assertEqual(len(report), 100)
+        assert ((placed["x"][1:].abs() >= 20.5) | (placed["y"][1:].abs() >= 20.5)).all()
+
+    def test_box_offset(self):
+        # TP2 is clear of TP1's position but its pads are offset onto TP1
+        components_df = pd.DataFrame({"refdes": ["TP1", "TP2"], "x": [0, 3], "y": [0, 0], "width": [2, 2], "height": [2, 2], "offset_x": [0, -2], "offset_y": [0, 0]})
+        placed, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(list(report["refdes"]), ["TP2"])
+        self.assertEqual(list(placed["x"]), [0, 4])
+
+        components_df["offset_x"] = [0, 2]
+        _, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(len(report), 0)
+
+
+    def test_sides_dont_conflict(self):
+        components_df = pd.DataFrame({"refdes": ["U1", "C1"], "x": [0, 0], "y": [0, 0], "width": [4, 1], "height": [4, 1], "on_top": [True, False]})
+        placed, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(len(report), 0)
+        self.assertEqual(list(placed["x"]), [0, 0])
+
+        components_df["through_hole"] = [True, False]
+        _, report = legalize.legalize_placement(components_df, grid=0.5)
+        self.assertEqual(list(report["refdes"]), ["C1"])
+
+    def test_extents_mirrored_on_bottom(self):
+        board = _Board([_Footprint("C1", pcbnew.F_Cu), _Footprint("C2", pcbnew.B_Cu), _Footprint("C3", pcbnew.B_Cu)])
+        components_df = pd.DataFrame({
+            "refdes": ["C1", "C2", "C3"],
+            "x": [0.0] * 3,
+            "y": [0.0] * 3,
+            "rotation": [0.0] * 3,
+            "side": [SideEnum.current, SideEnum.current, SideEnum.top],
+        })
+        with mock.patch.object(legalize, "flip_mirrors_x", return_value=True):
+            extents = legalize.add_footprint_extents(board, components_df)
+        self.assertEqual(list(extents["on_top"]), [True, False, True])
+        self.assertEqual(list(extents["offset_x"]), [1, -1, 1])
+        self.assertEqual(list(extents["offset_y"]), [1, 1, 1])
+        self.assertEqual(list(extents["width"]), [2, 2, 2])
+
+        with mock.patch.object(legalize, "flip_mirrors_x", return_value=False):
+            extents = legalize.add_footprint_extents(board, components_df)
+        self.assertEqual(list(extents["offset_x"]), [1, 1, 1])
+        self.assertEqual(list(extents["offset_y"]), [1, -1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
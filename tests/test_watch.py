@@ -0,0 +1,63 @@
+"""Tests for `kicad_parts_placer.watch`."""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from kicad_parts_placer import watch
+from kicad_parts_placer.kicad_parts_placer import SideEnum
+
+
+def _components(rows):
+    return pd.DataFrame(rows, columns=["refdes", "x", "y", "rotation", "side"])
+
+
+class TestWatch(unittest.TestCase):
+    def test_diff_components(self):
+        previous = _components([("C1", 1.0, 2.0, 0.0, SideEnum.top), ("C2", 3.0, 4.0, 0.0, SideEnum.top)])
+        current = _components([
+            ("C1", 1.0, 2.0, 0.0, SideEnum.top),
+            ("C2", 3.0, 4.0, 90.0, SideEnum.top),
+            ("C3", 5.0, 6.0, 0.0, SideEnum.bottom),
+        ])
+        changed = watch.diff_components(previous, current)
+        self.assertEqual(list(changed["refdes"]), ["C2", "C3"])
+
+    def test_diff_components_unchanged(self):
+        previous = _components([("C1", 1.0, 2.0, 0.0, SideEnum.top)])
+        self.assertEqual(len(watch.diff_components(previous, previous.copy())), 0)
+        self.assertEqual(len(watch.diff_components(None, previous)), 1)
+
+
+    def test_watch_survives_bad_pass(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = Path(directory) / "parts.csv"
+            contents = [
+                # side blanked mid edit
+                "refdes,x,y,side\nC1,1,2,\n",
+                "refdes,x,y,side\nC1,1,2,top\n",
+            ]
+
+            def save_config(*_args):
+                if not contents:
+                    raise KeyboardInterrupt
+                config.write_text(contents.pop(0))
+                return len(contents)
+
+            board = mock.Mock()
+            with mock.patch.object(watch, "_wait_for_change", side_effect=save_config), mock.patch.object(
+                watch, "get_footprint_index", return_value={}
+            ), mock.patch.object(watch, "place_parts") as place_parts, mock.patch.object(watch, "add_to_group"):
+                with self.assertLogs("kicad_parts_placer", "ERROR"):
+                    watch.watch_config(board, str(config), "out.kicad_pcb", _components([]), "parts")
+
+            self.assertEqual(place_parts.call_count, 1)
+            self.assertEqual(list(place_parts.call_args.args[1]["refdes"]), ["C1"])
+            board.Save.assert_called_once_with("out.kicad_pcb")
+
+
+if __name__ == "__main__":
+    unittest.main()